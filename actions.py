@@ -0,0 +1,134 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+
+from .client import get_breaker, jenkins_url
+from .history import job_path
+
+ACTIONS = ('build', 'enable', 'disable', 'abort')
+# Defaults for the tool's bulk_concurrency / bulk_rate settings
+BULK_CONCURRENCY = 4
+# Requests per second per controller, shared by all running batches
+BULK_RATE = 5
+RESULT_TTL = 3600
+# Minimum seconds between two progress writes to the cache
+PROGRESS_INTERVAL = 0.5
+
+
+class TokenBucket:
+    """Allow ``rate`` calls per second on average and bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+    def configure(self, rate, burst):
+        with self._lock:
+            self.rate = rate
+            self.burst = burst
+            self._tokens = min(self._tokens, burst)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(url, rate, burst):
+    """The controller's one bucket; a batch with other settings retunes it rather than replacing it."""
+    with _buckets_lock:
+        bucket = _buckets.get(url)
+        if bucket is None:
+            bucket = _buckets[url] = TokenBucket(rate, burst)
+        elif (bucket.rate, bucket.burst) != (rate, burst):
+            bucket.configure(rate, burst)
+        return bucket
+
+
+def run_action(server, action, job, bucket):
+    """Run one action on one job, taking a token before every request."""
+    bucket.acquire()
+    if action == 'build':
+        server.build_job(job)
+    elif action == 'enable':
+        server.enable_job(job)
+    elif action == 'disable':
+        server.disable_job(job)
+    elif action == 'abort':
+        last = server.get_info(job_path(job), '?tree=lastBuild[number,building]').get('lastBuild') or {}
+        if not last.get('building'):
+            return "not running"
+        bucket.acquire()
+        server.stop_build(job, last['number'])
+    else:
+        raise ValueError(f"unknown action {action!r}")
+    return "ok"
+
+
+def progress_key(run_id):
+    return f"jenkins:bulk:{run_id}"
+
+
+def start_bulk(action, targets, concurrency=BULK_CONCURRENCY, rate=BULK_RATE):
+    """Run ``action`` on ``targets`` (``(instance, server, job)`` tuples) in the background; return the run id.
+
+    At most ``concurrency`` requests are in flight and each controller gets at
+    most ``rate`` requests per second. Results are published to the cache as
+    they come in, see ``progress_key``.
+    """
+    # A zero or negative setting would stall the run (or divide by zero)
+    concurrency = max(1, int(concurrency))
+    rate = float(rate)
+    if not rate > 0:
+        rate = BULK_RATE
+    run_id = uuid.uuid4().hex
+    cache.set(progress_key(run_id), {'action': action, 'total': len(targets), 'results': [], 'done': False}, RESULT_TTL)
+    threading.Thread(target=_run_bulk, args=(run_id, action, targets, concurrency, rate), daemon=True).start()
+    return run_id
+
+
+def _run_bulk(run_id, action, targets, concurrency, rate):
+    state = {'action': action, 'total': len(targets), 'results': [], 'done': False}
+    lock = threading.Lock()
+    last_write = [0]
+    # Controllers known to be down fail at once instead of timing out job by job
+    down = {url for url in {jenkins_url(instance) for instance, _, _ in targets} if not get_breaker(url).allow()}
+
+    def run(target):
+        instance, server, job = target
+        url = jenkins_url(instance)
+        try:
+            if url in down:
+                raise RuntimeError("Jenkins is unreachable")
+            message = run_action(server, action, job, get_bucket(url, rate, concurrency))
+            ok = True
+        except Exception as e:
+            message = str(e).split('\n')[0]
+            ok = False
+        with lock:
+            state['results'].append({'job': job, 'instance': instance.name, 'ok': ok, 'message': message})
+            if time.monotonic() - last_write[0] >= PROGRESS_INTERVAL:
+                last_write[0] = time.monotonic()
+                cache.set(progress_key(run_id), state, RESULT_TTL)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='jenkins-bulk') as pool:
+        list(pool.map(run, targets))
+    state['done'] = True
+    cache.set(progress_key(run_id), state, RESULT_TTL)
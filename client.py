@@ -0,0 +1,181 @@
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import jenkins as python_jenkins
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import InstrumentedClient, measure_responses
+
+# Connections kept alive per controller. Jobs auto-refresh, the nodes/plugins
+# tabs and the password change all share the same pool.
+POOL_SIZE = 10
+# (connect, read) timeouts for every API call
+CONNECT_TIMEOUT = 3
+READ_TIMEOUT = 20
+
+# Bounded pool for Jenkins calls that run side by side (e.g. the overview tab)
+API_WORKERS = 8
+api_executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix='jenkins-api')
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def jenkins_url(tool):
+    if tool.config_data.get('url'):
+        # Controllers on other hosts are configured by URL
+        return tool.config_data['url'].rstrip('/')
+    port = tool.config_data.get('port', '8080')
+    return f"http://localhost:{port}"
+
+
+def get_credentials(tool):
+    username = tool.config_data.get('username', 'admin')
+    password = tool.config_data.get('api_token') or tool.config_data.get('password')
+    return username, password
+
+
+def _client_key(url, username, password):
+    # Never keep the secret itself in the registry key
+    digest = hashlib.sha256(password.encode('utf-8')).hexdigest()
+    return (url, username, digest)
+
+
+def get_client(url, username, password):
+    """Return a shared client for the given controller and credentials.
+
+    The python-jenkins client keeps its own ``requests`` session and caches the
+    CSRF crumb after the first write, so reusing one instance per credential set
+    avoids a new TCP/auth handshake and crumb round trip on every tab refresh.
+    Its method calls are timed, see ``metrics.InstrumentedClient``.
+    """
+    key = _client_key(url, username, password)
+    with _lock:
+        server = _clients.get(key)
+        if server is None:
+            # Credentials for this url/user changed: drop the old session
+            for stale in [k for k in _clients if k[:2] == key[:2]]:
+                _close(_clients.pop(stale))
+            server = python_jenkins.Jenkins(url, username=username, password=password, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            server._session.mount(url, HTTPAdapter(pool_maxsize=POOL_SIZE))
+            server = _clients[key] = InstrumentedClient(measure_responses(server))
+    return server
+
+
+def get_tool_client(tool):
+    username, password = get_credentials(tool)
+    if not password:
+        return None
+    return get_client(jenkins_url(tool), username, password)
+
+
+def invalidate_clients(url=None):
+    with _lock:
+        for key in [k for k in _clients if url is None or k[0] == url]:
+            _close(_clients.pop(key))
+
+
+def _close(server):
+    try:
+        server._session.close()
+    except Exception:
+        pass
+
+
+# Errors meaning the controller itself is down or restarting, as opposed to
+# auth or "not found" errors which say nothing about reachability.
+UNREACHABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    python_jenkins.TimeoutException,
+    python_jenkins.BadHTTPException,
+)
+FAILURE_THRESHOLD = 2
+BACKOFF_INITIAL = 5
+BACKOFF_MAX = 300
+PROBE_TIMEOUT = (1, 2)
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitBreaker:
+    """Per-controller fast-fail state.
+
+    ``closed``: calls go through. After ``FAILURE_THRESHOLD`` unreachable errors
+    in a row it goes ``open`` and calls are refused until ``retry_at``. Then one
+    caller gets ``half_open`` and runs a cheap probe; success closes the breaker,
+    failure reopens it with a doubled (jittered) backoff.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.state = 'closed'
+        self.failures = 0
+        self.backoff = BACKOFF_INITIAL
+        self.retry_at = 0
+        self.reason = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state != 'open' or time.time() < self.retry_at:
+                return False
+            self.state = 'half_open'
+        if self.probe():
+            self.record_success()
+            return True
+        self.record_failure()
+        return False
+
+    def probe(self):
+        try:
+            response = requests.get(f"{self.url}/login", timeout=PROBE_TIMEOUT)
+            return 'X-Jenkins' in response.headers and response.status_code < 500
+        except requests.RequestException:
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.backoff = BACKOFF_INITIAL
+            self.reason = None
+
+    def record_failure(self, reason=None, trip=False):
+        with self._lock:
+            self.failures += 1
+            if reason:
+                self.reason = reason
+            if self.state == 'half_open':
+                self.backoff = min(self.backoff * 2, BACKOFF_MAX)
+            elif not trip and self.failures < FAILURE_THRESHOLD:
+                return
+            self.state = 'open'
+            self.retry_at = time.time() + self.backoff * random.uniform(0.8, 1.2)
+
+    def retry_in(self):
+        return max(0, int(self.retry_at - time.time()))
+
+
+def get_breaker(url):
+    with _breakers_lock:
+        breaker = _breakers.get(url)
+        if breaker is None:
+            breaker = _breakers[url] = CircuitBreaker(url)
+        return breaker
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def is_unreachable_error(exc):
+    return isinstance(exc, UNREACHABLE_ERRORS)
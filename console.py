@@ -0,0 +1,78 @@
+import codecs
+import json
+import time
+
+import requests
+
+from .client import CONNECT_TIMEOUT, READ_TIMEOUT, is_unreachable_error
+from .history import job_path
+from .metrics import timed
+
+# Bytes relayed per event; nothing larger is ever held in memory
+CHUNK_SIZE = 64 * 1024
+POLL_INTERVAL = 1
+# A stream is closed after this long; EventSource reconnects with Last-Event-ID
+STREAM_TIMEOUT = 300
+
+
+def console_url(server, job, number):
+    return f"{server.server.rstrip('/')}/{job_path(job)}/{number}/logText/progressiveText"
+
+
+def stream_console(server, job, number, start=0, auth=None, breaker=None, timeout=STREAM_TIMEOUT):
+    """Relay a build's console as server-sent events, starting at byte ``start``.
+
+    Each request to Jenkins' progressive text API is read in ``CHUNK_SIZE``
+    pieces and passed on right away. Every ``log`` event carries the byte
+    offset reached as its id, so a reconnect resumes there. While Jenkins
+    answers ``X-More-Data: true`` the build is still running and the API is
+    polled again from the new offset; a ``done`` event ends the stream.
+
+    The requests bypass the python-jenkins client, so ``auth`` is passed
+    explicitly and unreachable errors are reported to ``breaker``.
+    """
+    url = console_url(server, job, number)
+    offset = start
+    deadline = time.time() + timeout
+    yield "retry: 2000\n\n"
+    while True:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            with timed('console.progressiveText'):
+                response = server._session.get(
+                    url, params={'start': offset}, auth=auth,
+                    stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                )
+        except requests.RequestException as e:
+            if breaker is not None and is_unreachable_error(e):
+                breaker.record_failure(str(e).split('\n')[0])
+            yield _event('failed', offset, {'error': str(e).split('\n')[0]})
+            return
+        if breaker is not None:
+            breaker.record_success()
+        try:
+            if response.status_code != 200:
+                yield _event('failed', offset, {'status': response.status_code})
+                return
+            consumed = offset
+            for chunk in response.iter_content(CHUNK_SIZE):
+                consumed += len(chunk)
+                text = decoder.decode(chunk)
+                if text:
+                    # Bytes of a character split across chunks are sent next time
+                    yield _event('log', consumed - len(decoder.getstate()[0]), {'text': text})
+            more = response.headers.get('X-More-Data') == 'true'
+            # Resume before a character that is still incomplete
+            offset = int(response.headers.get('X-Text-Size') or consumed) - len(decoder.getstate()[0])
+        finally:
+            response.close()
+        if not more:
+            yield _event('done', offset, {})
+            return
+        if time.time() >= deadline:
+            return
+        time.sleep(POLL_INTERVAL)
+
+
+def _event(kind, offset, data):
+    return f"id: {offset}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
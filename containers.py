@@ -0,0 +1,257 @@
+import json
+import subprocess
+import threading
+import time
+
+import requests
+
+from .metrics import timed, record_cache
+
+HEADER_TIMEOUT = (1, 2)
+
+# ``docker events`` and discovery call the docker CLI directly instead of going
+# through core.docker_cli_wrapper.DockerCLI: the wrapper only offers the
+# object API (one ``containers.get`` inspect per container) and blocking
+# commands, while these need ``docker ps --format``, one ``docker inspect`` for
+# many ids and a streamed ``docker events``. The CLI still picks up the host
+# and context from the environment (DOCKER_HOST, DOCKER_CONTEXT) like the
+# wrapper's commands do. All such calls build their command with docker_command().
+DOCKER_BINARY = 'docker'
+
+# (container id, image id) -> Jenkins version
+_versions = {}
+_exec_attempted = set()
+_versions_lock = threading.Lock()
+
+
+def resolve_version(container):
+    """Return the Jenkins version running in ``container``, memoized per container and image.
+
+    The image environment and the ``X-Jenkins`` response header are tried first;
+    starting a JVM with ``jenkins.war --version`` only happens once per new
+    container and only if both fail.
+    """
+    attrs = container.attrs if isinstance(container.attrs, dict) else {}
+    key = (container.id, attrs.get('Image'))
+    with _versions_lock:
+        if key in _versions:
+            return _versions[key]
+
+    version = _version_from_env(attrs) or _version_from_header(attrs)
+    if not version:
+        with _versions_lock:
+            if key in _exec_attempted:
+                return None
+            _exec_attempted.add(key)
+        version = _version_from_exec(container)
+    if version:
+        with _versions_lock:
+            _versions[key] = version
+    return version
+
+
+def reset_versions():
+    with _versions_lock:
+        _versions.clear()
+        _exec_attempted.clear()
+
+
+def host_port(attrs, container_port='8080/tcp'):
+    ports = (attrs.get('NetworkSettings') or {}).get('Ports') or (attrs.get('HostConfig') or {}).get('PortBindings') or {}
+    for binding in ports.get(container_port) or []:
+        if binding.get('HostPort'):
+            return binding['HostPort']
+    return None
+
+
+def _version_from_env(attrs):
+    # The official jenkins/jenkins images set JENKINS_VERSION
+    for item in (attrs.get('Config') or {}).get('Env') or []:
+        if item.startswith('JENKINS_VERSION='):
+            return item.split('=', 1)[1] or None
+    return None
+
+
+def _version_from_header(attrs):
+    port = host_port(attrs)
+    if not port:
+        return None
+    try:
+        response = requests.get(f"http://localhost:{port}/login", timeout=HEADER_TIMEOUT)
+        return response.headers.get('X-Jenkins') or None
+    except requests.RequestException:
+        return None
+
+
+def _version_from_exec(container):
+    with timed('docker.container.exec_run'):
+        res = container.exec_run("java -jar /usr/share/jenkins/jenkins.war --version")
+    if res.exit_code == 0:
+        return res.output.decode().strip()
+    return None
+
+
+# Full inspect at least this often even if the event stream is healthy
+RECONCILE_INTERVAL = 60
+EVENTS_RETRY_DELAY = 5
+# A watcher whose container nobody asked about for this long stops
+IDLE_TIMEOUT = 10 * RECONCILE_INTERVAL
+RUNNING_ACTIONS = {'start', 'restart', 'unpause'}
+STOPPED_ACTIONS = {'die', 'stop', 'kill', 'pause', 'oom', 'destroy'}
+
+
+class ContainerStatusCache:
+    """In-memory container status fed by ``docker events``.
+
+    Each watched container gets a daemon thread that inspects it, then follows
+    ``docker events`` for it until the next reconcile deadline, and repeats.
+    Reads are served from memory; only the very first read inspects inline.
+    A watcher stops (and forgets its entry) after ``IDLE_TIMEOUT`` without reads.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._watchers = {}
+        self._last_read = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, lookup):
+        self._last_read[name] = time.time()
+        entry = self._entries.get(name)
+        if entry is None:
+            record_cache('container_status', 'miss')
+            entry = self.reconcile(name, lookup)
+        else:
+            record_cache('container_status', 'hit')
+        self._watch(name, lookup)
+        return entry
+
+    def status(self, name, lookup):
+        return self.get(name, lookup)['status']
+
+    def set_status(self, name, status):
+        with self._lock:
+            entry = self._entries.get(name)
+            self._entries[name] = {'status': status, 'container': entry['container'] if entry else None}
+
+    def reconcile(self, name, lookup):
+        try:
+            container = lookup(name)
+        except Exception:
+            container = None
+        status = 'running' if container and container.status == 'running' else 'stopped'
+        entry = {'status': status, 'container': container}
+        with self._lock:
+            self._entries[name] = entry
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._last_read.clear()
+
+    def _watch(self, name, lookup):
+        with self._lock:
+            watcher = self._watchers.get(name)
+            if watcher and watcher.is_alive():
+                return
+            watcher = threading.Thread(target=self._follow, args=(name, lookup), daemon=True, name=f'jenkins-events-{name}')
+            self._watchers[name] = watcher
+        watcher.start()
+
+    def _follow(self, name, lookup):
+        while True:
+            with self._lock:
+                if time.time() - self._last_read.get(name, 0) >= IDLE_TIMEOUT:
+                    # Removed instance, renamed container or just nobody looking
+                    self._watchers.pop(name, None)
+                    self._entries.pop(name, None)
+                    self._last_read.pop(name, None)
+                    return
+            until = int(time.time() + RECONCILE_INTERVAL)
+            try:
+                process = subprocess.Popen(
+                    docker_command('events', '--filter', 'type=container', '--filter', f'container={name}',
+                                   '--until', str(until), '--format', '{{json .}}'),
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                )
+                for line in process.stdout:
+                    self._on_event(name, lookup, line)
+                process.wait()
+            except Exception:
+                time.sleep(EVENTS_RETRY_DELAY)
+            self.reconcile(name, lookup)
+            if time.time() < until:
+                # The stream ended early (daemon restart, CLI error): don't spin
+                time.sleep(EVENTS_RETRY_DELAY)
+
+    def _on_event(self, name, lookup, line):
+        try:
+            action = json.loads(line).get('Action') or ''
+        except ValueError:
+            return
+        action = action.split(':')[0]
+        if action in RUNNING_ACTIONS:
+            # Re-inspect so the cached container (id, image) matches the new one
+            self.reconcile(name, lookup)
+        elif action in STOPPED_ACTIONS:
+            self.set_status(name, 'stopped')
+
+
+status_cache = ContainerStatusCache()
+
+
+DISCOVERY_TIMEOUT = 30
+JENKINS_HOME = '/var/jenkins_home'
+
+
+def discover_controllers():
+    """Find every Jenkins controller container on the host.
+
+    One ``docker ps`` lists all containers with their image names (no per-image
+    inspect); the candidates are then inspected together in a single
+    ``docker inspect``. Running controllers come first.
+    """
+    listing = _docker('ps', '--all', '--no-trunc', '--format', '{{.ID}}\t{{.Names}}\t{{.Image}}')
+    ids = []
+    for line in listing.splitlines():
+        fields = line.split('\t')
+        if len(fields) == 3 and any('jenkins' in field.lower() for field in fields[1:]):
+            ids.append(fields[0])
+    if not ids:
+        return []
+    controllers = [_controller(attrs) for attrs in json.loads(_docker('inspect', *ids))]
+    controllers = [c for c in controllers if c]
+    controllers.sort(key=lambda c: (c['status'] != 'running', c['name']))
+    return controllers
+
+
+def docker_command(*args):
+    return [DOCKER_BINARY, *args]
+
+
+def _docker(*args):
+    return subprocess.run(
+        docker_command(*args), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, timeout=DISCOVERY_TIMEOUT,
+    ).stdout.decode()
+
+
+def _controller(attrs):
+    config = attrs.get('Config') or {}
+    volume = None
+    for mount in attrs.get('Mounts') or []:
+        if mount.get('Destination') == JENKINS_HOME:
+            volume = mount.get('Name') or mount.get('Source')
+    # Agents (jenkins/inbound-agent etc.) match by name but serve no UI
+    if '8080/tcp' not in (config.get('ExposedPorts') or {}) and not volume and not _version_from_env(attrs):
+        return None
+    return {
+        'id': attrs.get('Id'),
+        'name': (attrs.get('Name') or '').lstrip('/'),
+        'image': config.get('Image'),
+        'status': (attrs.get('State') or {}).get('Status'),
+        'version': _version_from_env(attrs),
+        'port': host_port(attrs),
+        'agent_port': host_port(attrs, '50000/tcp'),
+        'volume': volume,
+    }
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+# Events are kept this long for dashboards that reconnect with Last-Event-ID
+EVENT_TTL = 300
+# A stream is closed after this long; EventSource reconnects on its own
+STREAM_TIMEOUT = 300
+POLL_INTERVAL = 0.5
+HEARTBEAT_INTERVAL = 15
+SEQ_KEY = 'jenkins:events:seq'
+
+_published = threading.Condition()
+
+
+def publish(kind, data):
+    """Append an event to the shared log (the Django cache) so every worker's streams see it."""
+    cache.add(SEQ_KEY, 0, None)
+    seq = cache.incr(SEQ_KEY)
+    cache.set(f"jenkins:events:{seq}", (kind, data), EVENT_TTL)
+    # Wake this process's streams right away; others notice within POLL_INTERVAL
+    with _published:
+        _published.notify_all()
+    return seq
+
+
+def latest_event_id():
+    return cache.get(SEQ_KEY) or 0
+
+
+def stream(since=None, timeout=STREAM_TIMEOUT):
+    """Yield server-sent events published after event id ``since`` (default: from now on)."""
+    seq = latest_event_id() if since is None else since
+    deadline = time.time() + timeout
+    last_write = time.time()
+    yield "retry: 3000\n\n"
+    while time.time() < deadline:
+        latest = latest_event_id()
+        if latest < seq:
+            # The cache was cleared
+            seq = latest
+        while seq < latest:
+            seq += 1
+            event = cache.get(f"jenkins:events:{seq}")
+            if event:
+                last_write = time.time()
+                yield format_event(seq, *event)
+        if time.time() - last_write >= HEARTBEAT_INTERVAL:
+            last_write = time.time()
+            yield ": ping\n\n"
+        with _published:
+            _published.wait(POLL_INTERVAL)
+
+
+def format_event(seq, kind, data):
+    lines = ''.join(f"data: {line}\n" for line in data.splitlines() or [''])
+    return f"id: {seq}\nevent: {kind}\n{lines}\n"
@@ -0,0 +1,183 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+
+from .jobs import DEFAULT_FOLDER_DEPTH
+from .sampler import percentile
+
+# Minimum seconds between two syncs of one controller (across all workers)
+SYNC_INTERVAL = 60
+# Builds requested per call while walking back to the last ingested one
+PAGE_SIZE = 100
+DEFAULT_WINDOW_DAYS = 7
+BUILD_FIELDS = 'number,result,duration,timestamp'
+FAILED_RESULTS = ('FAILURE', 'UNSTABLE')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    controller TEXT NOT NULL,
+    job TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    result TEXT,
+    duration INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (controller, job, number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS builds_by_time ON builds (controller, job, timestamp);
+CREATE TABLE IF NOT EXISTS cursors (
+    controller TEXT NOT NULL,
+    job TEXT NOT NULL,
+    last_number INTEGER NOT NULL,
+    PRIMARY KEY (controller, job)
+) WITHOUT ROWID;
+"""
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def db_path():
+    # Next to the project's data, never inside this module's (submodule) checkout
+    path = getattr(settings, 'JENKINS_HISTORY_DB', None)
+    if path:
+        return path
+    base_dir = getattr(settings, 'BASE_DIR', None)
+    if not base_dir:
+        raise ImproperlyConfigured("Set JENKINS_HISTORY_DB (or BASE_DIR) to store Jenkins build history.")
+    return os.path.join(str(base_dir), 'jenkins_build_history.sqlite3')
+
+
+def connect():
+    path = db_path()
+    conn = sqlite3.connect(path, timeout=10)
+    with _init_lock:
+        if path not in _initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            _initialized.add(path)
+    return conn
+
+
+def job_path(name):
+    # "folder/job" -> "job/folder/job/job"
+    return '/'.join(f'job/{part}' for part in name.split('/'))
+
+
+def last_builds_tree(depth):
+    tree = 'jobs[name,lastCompletedBuild[number]]'
+    for _ in range(depth):
+        tree = f'jobs[name,lastCompletedBuild[number],{tree}]'
+    return tree
+
+
+def fetch_last_completed(server, depth=DEFAULT_FOLDER_DEPTH):
+    """``{job name: last completed build number}`` for every job, in one request."""
+    data = server.get_info(query=f'?tree={last_builds_tree(depth)}')
+    numbers = {}
+    stack = [('', data.get('jobs', []))]
+    while stack:
+        prefix, items = stack.pop()
+        for item in items:
+            name = prefix + item.get('name', '')
+            if 'jobs' in item:
+                stack.append((name + '/', item['jobs']))
+            elif item.get('lastCompletedBuild'):
+                numbers[name] = item['lastCompletedBuild'].get('number', 0)
+    return numbers
+
+
+def fetch_new_builds(server, job, after):
+    """Completed builds of ``job`` numbered above ``after``, newest first.
+
+    Builds come newest first, so paging stops at the first page that reaches
+    ``after``: only the new builds are ever transferred.
+    """
+    builds = []
+    start = 0
+    while True:
+        page = server.get_info(job_path(job), f'?tree=builds[{BUILD_FIELDS}]{{{start},{start + PAGE_SIZE}}}').get('builds', [])
+        for build in page:
+            if build['number'] <= after:
+                return builds
+            builds.append(build)
+        if len(page) < PAGE_SIZE:
+            return builds
+        start += PAGE_SIZE
+
+
+def sync(server, controller, depth=DEFAULT_FOLDER_DEPTH):
+    """Ingest the builds finished since the last sync; return how many were added."""
+    latest = fetch_last_completed(server, depth)
+    with closing(connect()) as conn:
+        cursors = dict(conn.execute('SELECT job, last_number FROM cursors WHERE controller = ?', (controller,)))
+    added = 0
+    for job, number in latest.items():
+        after = cursors.get(job, 0)
+        if number <= after:
+            continue
+        builds = fetch_new_builds(server, job, after)
+        # A build still running below a finished one must be picked up next time
+        running = [b['number'] for b in builds if b.get('result') is None]
+        cursor = min(running) - 1 if running else number
+        rows = [
+            (controller, job, b['number'], b['result'], b.get('duration') or 0, b.get('timestamp') or 0)
+            for b in builds if b.get('result') is not None
+        ]
+        with closing(connect()) as conn, conn:
+            conn.executemany('INSERT OR IGNORE INTO builds VALUES (?, ?, ?, ?, ?, ?)', rows)
+            conn.execute('INSERT OR REPLACE INTO cursors VALUES (?, ?, ?)', (controller, job, max(cursor, after)))
+        added += len(rows)
+    return added
+
+
+def schedule_sync(controller, server, depth=DEFAULT_FOLDER_DEPTH):
+    """Sync ``controller`` in the background unless it was synced in the last ``SYNC_INTERVAL`` seconds."""
+    if cache.add(f"jenkins:history:synced:{controller}", True, SYNC_INTERVAL):
+        _start_sync(controller, server, depth)
+
+
+def _start_sync(controller, server, depth):
+    threading.Thread(target=_sync_quietly, args=(controller, server, depth), daemon=True).start()
+
+
+def _sync_quietly(controller, server, depth):
+    try:
+        sync(server, controller, depth)
+    except Exception:
+        # Retried on the next interval; a partial sync keeps its cursors
+        pass
+
+
+def job_stats(controller, jobs, window_days=DEFAULT_WINDOW_DAYS):
+    """Build count, p50/p95 duration (seconds) and failure rate per job over the last ``window_days``."""
+    if not jobs:
+        return {}
+    since = int((time.time() - window_days * 86400) * 1000)
+    durations = {}
+    failures = {}
+    with closing(connect()) as conn:
+        for start in range(0, len(jobs), 500):
+            chunk = jobs[start:start + 500]
+            rows = conn.execute(
+                "SELECT job, duration, result FROM builds WHERE controller = ? AND timestamp >= ? "
+                f"AND job IN ({','.join('?' * len(chunk))})",
+                [controller, since, *chunk],
+            )
+            for job, duration, result in rows:
+                durations.setdefault(job, []).append(duration / 1000)
+                failures[job] = failures.get(job, 0) + (result in FAILED_RESULTS)
+    return {
+        job: {
+            'builds': len(values),
+            'p50': percentile(values, 0.5),
+            'p95': percentile(values, 0.95),
+            'failure_rate': failures[job] / len(values),
+        }
+        for job, values in durations.items()
+    }
@@ -0,0 +1,364 @@
+import codecs
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from django.core.cache import cache
+from django.db import connection
+
+from .metrics import timed
+
+PASSWORD_MARKER = 'Please use the following password to proceed to installation:'
+PASSWORD_PATTERN = re.compile(re.escape(PASSWORD_MARKER) + r'.*?([a-f0-9]{32})', re.DOTALL)
+# Upper bound on the text kept between chunks while the password line is pending
+MAX_WINDOW = 4096
+INITIAL_PASSWORD_TIMEOUT = 150
+LOG_POLL_INTERVAL = 1
+
+JENKINS_IMAGE = 'jenkins/jenkins'
+JENKINS_TAG = 'lts'
+NETWORK_NAME = 'jenkins_network'
+# Minimum seconds between two pull progress reports
+PROGRESS_INTERVAL = 1
+# Minimum seconds between two current_stage writes to the database
+STAGE_SAVE_INTERVAL = 3
+PROGRESS_CACHE_TTL = 3600
+
+RECOMMENDED_PLUGINS = [
+    "workflow-aggregator", "git", "pipeline-stage-view",
+    "ssh-slaves", "matrix-auth", "pam-auth", "ldap",
+    "email-ext", "mailer", "dark-theme",
+]
+INSTALL_WORKERS = 2
+# An install holds this lease (refreshed while it runs) so that only one
+# process works on a tool at a time
+LEASE_TTL = 60
+
+PLUGIN_DIR = '/var/jenkins_home/plugins'
+# Mount point of the plugin cache volume shared by all installs on this host
+PLUGIN_CACHE_DIR = '/var/jenkins_plugin_cache'
+
+
+class InstallScheduler:
+    """Bounded pool for install jobs with at most one job per tool."""
+
+    def __init__(self, max_workers=INSTALL_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='jenkins-installer')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def is_running(self, tool):
+        with self._lock:
+            job = self._jobs.get(tool.pk)
+        if job and not job.done():
+            return True
+        # Possibly running in another process
+        return cache.get(_lease_key(tool)) is not None
+
+    def submit(self, tool, run):
+        """Queue ``run`` for ``tool``; return False if an install for it is already queued or running."""
+        with self._lock:
+            job = self._jobs.get(tool.pk)
+            if job and not job.done():
+                return False
+            if not cache.add(_lease_key(tool), True, LEASE_TTL):
+                return False
+            stop = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(tool, stop), daemon=True).start()
+            self._jobs[tool.pk] = self._executor.submit(self._run, tool, run, stop)
+        return True
+
+    def _heartbeat(self, tool, stop):
+        while not stop.wait(LEASE_TTL / 3):
+            cache.set(_lease_key(tool), True, LEASE_TTL)
+
+    def _run(self, tool, run, stop):
+        try:
+            run()
+        finally:
+            stop.set()
+            cache.delete(_lease_key(tool))
+            connection.close()
+
+
+def _lease_key(tool):
+    return f"jenkins:install:lease:{tool.pk}"
+
+
+install_scheduler = InstallScheduler()
+
+
+def progress_cache_key(tool):
+    return f"jenkins:install:progress:{tool.pk}"
+
+
+class InstallProgress:
+    """Install progress writer for a ``Tool``.
+
+    Every stage goes to the cache right away (that is what the progress view
+    polls); the database only gets ``current_stage`` at most every
+    ``STAGE_SAVE_INTERVAL`` seconds, and only the fields that changed.
+    ``finish`` commits the final state unconditionally.
+    """
+
+    def __init__(self, tool):
+        self.tool = tool
+        self._last_save = 0
+        self._dirty = False
+
+    def stage(self, text):
+        self.tool.current_stage = text
+        self._publish()
+        if time.time() - self._last_save >= STAGE_SAVE_INTERVAL:
+            self.save('current_stage')
+        else:
+            self._dirty = True
+
+    def save(self, *fields):
+        if self._dirty and 'current_stage' not in fields:
+            fields += ('current_stage',)
+        self.tool.save(update_fields=list(fields))
+        self._last_save = time.time()
+        self._dirty = False
+        self._publish()
+
+    def finish(self):
+        self.save('status', 'current_stage', 'config_data', 'version')
+
+    def _publish(self):
+        cache.set(progress_cache_key(self.tool), {
+            'status': self.tool.status,
+            'stage': self.tool.current_stage,
+        }, PROGRESS_CACHE_TTL)
+
+
+def scan_for_password(chunks):
+    """Return the initial admin password from an iterable of raw log chunks.
+
+    Only the new chunk plus a small carry-over window is searched each time, so
+    the cost per chunk stays constant however long the log gets.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    window = ''
+    for chunk in chunks:
+        window += decoder.decode(chunk)
+        match = PASSWORD_PATTERN.search(window)
+        if match:
+            return match.group(1)
+        pos = window.rfind(PASSWORD_MARKER)
+        # Keep the marker (password follows a couple of lines later) or just
+        # enough of the tail to catch a marker split across chunks.
+        if pos != -1 and len(window) - pos <= MAX_WINDOW:
+            window = window[pos:]
+        else:
+            window = window[-len(PASSWORD_MARKER):]
+    return None
+
+
+def wait_for_initial_password(container, timeout=INITIAL_PASSWORD_TIMEOUT):
+    """Follow the container log until the initial password shows up or ``timeout`` passes."""
+    found = {}
+    done = threading.Event()
+    try:
+        with timed('docker.container.logs'):
+            stream = container.logs(stream=True, follow=True)
+    except TypeError:
+        stream = None
+    if stream is None or isinstance(stream, (bytes, str)) or not hasattr(stream, '__next__'):
+        # Log client without streaming support: it returns the log so far
+        stream = _poll_logs(container, time.time() + timeout)
+
+    def scan():
+        try:
+            found['password'] = scan_for_password(stream)
+        except Exception:
+            pass
+        finally:
+            done.set()
+
+    threading.Thread(target=scan, daemon=True).start()
+    done.wait(timeout)
+    close = getattr(stream, 'close', None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            pass
+    return found.get('password')
+
+
+def _poll_logs(container, deadline):
+    # Fallback: re-read the log but only hand on the bytes not seen yet
+    seen = 0
+    while time.time() < deadline:
+        with timed('docker.container.logs'):
+            logs = container.logs()
+        if len(logs) > seen:
+            yield logs[seen:]
+            seen = len(logs)
+        time.sleep(LOG_POLL_INTERVAL)
+
+
+def prepare_host(client, volume_names, report, completed=(), checkpoint=None):
+    """Create the volumes and network and make the image available, all at once.
+
+    Steps named in ``completed`` (``volume:<name>``, ``network``, ``image``) are
+    skipped; ``checkpoint`` is called with a step's name once it has finished.
+    ``report`` and ``checkpoint`` are only ever called from the calling thread so
+    they may write to the database.
+    """
+    progress = {'image': f"Checking image {JENKINS_IMAGE}:{JENKINS_TAG}..."}
+    steps = {f'volume:{name}': (_create_volume, (client, name), {}) for name in volume_names}
+    steps['network'] = (_ensure_network, (client,), {})
+    steps['image'] = (ensure_image, (client, lambda text: progress.update(image=text)), {})
+    steps = {name: step for name, step in steps.items() if name not in completed}
+    if not steps:
+        return
+    with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix='jenkins-install') as pool:
+        futures = {pool.submit(fn, *args, **kwargs): name for name, (fn, args, kwargs) in steps.items()}
+        last = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_EXCEPTION)
+            for future in done:
+                future.result()
+                if checkpoint:
+                    checkpoint(futures[future])
+            if 'image' in steps and progress['image'] != last:
+                last = progress['image']
+                report(last)
+
+
+def _create_volume(client, name):
+    with timed('docker.volumes.create'):
+        client.volumes.create(name=name)
+
+
+def _ensure_network(client):
+    with timed('docker.networks.get'):
+        network = client.networks.get(NETWORK_NAME)
+    if not network:
+        with timed('docker.networks.create'):
+            client.networks.create(NETWORK_NAME, driver="bridge")
+
+
+def ensure_image(client, report, repository=JENKINS_IMAGE, tag=JENKINS_TAG):
+    """Make ``repository:tag`` available locally.
+
+    Nothing is pulled when the local image already has the registry's digest.
+    If a local image exists but can't be confirmed current it is used as is and
+    refreshed in the background; only a missing image is pulled in the foreground.
+    """
+    reference = f"{repository}:{tag}"
+    local_digests = _local_digests(client, reference)
+    if local_digests is not None:
+        remote = _registry_digest(client, reference)
+        if remote and any(d.endswith(remote) for d in local_digests):
+            report(f"Image {reference} is up to date")
+            return
+        threading.Thread(target=_pull_quietly, args=(client, repository, tag), daemon=True).start()
+        report(f"Using local image {reference} (refreshing in background)")
+        return
+    pull_image(client, repository, tag, report)
+
+
+def pull_image(client, repository, tag, report):
+    api = getattr(client, 'api', None)
+    if api is None or not hasattr(api, 'pull'):
+        report(f"Pulling Jenkins image ({repository}:{tag})...")
+        with timed('docker.images.pull'):
+            client.images.pull(repository, tag=tag)
+        return
+    with timed('docker.images.pull'):
+        _follow_pull(api.pull(repository, tag=tag, stream=True, decode=True), repository, tag, report)
+
+
+def _follow_pull(events, repository, tag, report):
+    layers = {}
+    last_report = 0
+    for event in events:
+        if event.get('error'):
+            raise RuntimeError(event['error'])
+        layer = event.get('id')
+        detail = event.get('progressDetail') or {}
+        if layer and detail.get('total'):
+            layers[layer] = (detail.get('current', 0), detail['total'])
+        elif layer and event.get('status') in ('Pull complete', 'Already exists') and layer in layers:
+            layers[layer] = (layers[layer][1], layers[layer][1])
+        if layers and time.time() - last_report >= PROGRESS_INTERVAL:
+            last_report = time.time()
+            current = sum(c for c, _ in layers.values())
+            total = sum(t for _, t in layers.values())
+            finished = sum(1 for c, t in layers.values() if c >= t)
+            report(f"Pulling {repository}:{tag}: {current / 1e6:.1f}/{total / 1e6:.1f} MB ({finished}/{len(layers)} layers)")
+
+
+def _pull_quietly(client, repository, tag):
+    try:
+        with timed('docker.images.pull'):
+            client.images.pull(repository, tag=tag)
+    except Exception:
+        pass
+
+
+def _local_digests(client, reference):
+    """``RepoDigests`` of the local image, or ``None`` if it isn't present."""
+    try:
+        with timed('docker.images.get'):
+            image = client.images.get(reference)
+    except Exception:
+        return None
+    if not image:
+        return None
+    attrs = image.attrs if isinstance(getattr(image, 'attrs', None), dict) else {}
+    return [d for d in attrs.get('RepoDigests') or [] if isinstance(d, str)]
+
+
+def _registry_digest(client, reference):
+    try:
+        with timed('docker.images.get_registry_data'):
+            digest = client.images.get_registry_data(reference).id
+        return digest if isinstance(digest, str) else None
+    except Exception:
+        return None
+
+
+def provision_plugins(container, report, plugins=RECOMMENDED_PLUGINS):
+    """Install ``plugins`` and their dependencies into the controller's plugin directory.
+
+    Plugins already in the cache volume are copied in first. ``jenkins-plugin-cli``
+    (shipped in the jenkins/jenkins image) then resolves the full dependency
+    closure in one go, skips what is already present and downloads the rest in
+    parallel with checksum verification. Whatever it fetched is copied back
+    into the cache so the next install also works without internet.
+
+    Returns ``(changed, online)``: whether new plugins were added (Jenkins must
+    restart once) and whether the update center was reachable.
+    """
+    before = _count_plugins(container)
+    report("Installing plugins from the local plugin cache...")
+    _exec(container, f"sh -c 'mkdir -p {PLUGIN_DIR} && cp -n {PLUGIN_CACHE_DIR}/*.jpi {PLUGIN_DIR}/ 2>/dev/null; true'")
+
+    report(f"Resolving and downloading {len(plugins)} plugins and their dependencies...")
+    res = _exec(container, f"jenkins-plugin-cli --plugin-download-directory {PLUGIN_DIR} --plugins {' '.join(plugins)}")
+    online = res.exit_code == 0
+    if online:
+        # The cache volume is created root-owned
+        _exec(container, f"sh -c 'cp -u {PLUGIN_DIR}/*.jpi {PLUGIN_CACHE_DIR}/ 2>/dev/null; true'", user='root')
+    elif before == _count_plugins(container):
+        raise RuntimeError("update center unreachable and no cached plugins available")
+    return _count_plugins(container) != before, online
+
+
+def _exec(container, command, **kwargs):
+    with timed('docker.container.exec_run'):
+        return container.exec_run(command, **kwargs)
+
+
+def _count_plugins(container):
+    res = _exec(container, f"sh -c 'ls {PLUGIN_DIR}/*.jpi 2>/dev/null | wc -l'")
+    try:
+        return int(res.output.decode().strip())
+    except (AttributeError, ValueError):
+        return 0
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Longest a page waits for any one controller. All controllers are asked at
+# once, so a page takes as long as the slowest of them, never their sum.
+INSTANCE_TIMEOUT = 10
+INSTANCE_WORKERS = 8
+instance_executor = ThreadPoolExecutor(max_workers=INSTANCE_WORKERS, thread_name_prefix='jenkins-instance')
+
+ROW_SORTS = ('instance', 'name')
+
+
+class Instance:
+    """One Jenkins controller managed by the tool.
+
+    It has a ``config_data`` like a ``Tool`` so the client helpers
+    (``jenkins_url``, ``get_tool_client``, ...) work on it as they are.
+    """
+
+    __slots__ = ('name', 'config_data')
+
+    def __init__(self, name, config_data):
+        self.name = name
+        self.config_data = config_data
+
+    def __repr__(self):
+        return f"Instance({self.name!r})"
+
+
+class CredentialsMissing(Exception):
+    pass
+
+
+class ControllerUnavailable(Exception):
+    """The controller's circuit breaker is open."""
+
+    def __init__(self, breaker):
+        super().__init__(breaker.reason or "Jenkins is not responding.")
+        self.reason = breaker.reason
+        self.retry_in = breaker.retry_in()
+
+
+def get_instances(tool):
+    """The tool's own controller first, then those listed in ``config_data['instances']``."""
+    instances = [Instance(tool.config_data.get('container_name', 'jenkins'), tool.config_data)]
+    for config in tool.config_data.get('instances') or []:
+        name = config.get('name') or config.get('url') or f"localhost:{config.get('port', '8080')}"
+        instances.append(Instance(name, config))
+    return instances
+
+
+def fan_out(instances, fetch, timeout=INSTANCE_TIMEOUT):
+    """Call ``fetch(instance)`` for every instance concurrently.
+
+    Returns ``(results, errors)``, lists of ``(instance, value)`` in instance
+    order. A controller that hasn't answered after ``timeout`` seconds gets a
+    ``TimeoutError``; its call finishes in the background.
+    """
+    if len(instances) == 1:
+        # Nothing to overlap with
+        try:
+            return [(instances[0], fetch(instances[0]))], []
+        except Exception as e:
+            return [], [(instances[0], e)]
+    futures = [(instance, instance_executor.submit(fetch, instance)) for instance in instances]
+    wait([future for _, future in futures], timeout=timeout)
+    results = []
+    errors = []
+    for instance, future in futures:
+        if not future.done():
+            errors.append((instance, TimeoutError(f"No answer within {timeout}s")))
+            continue
+        try:
+            results.append((instance, future.result()))
+        except Exception as e:
+            errors.append((instance, e))
+    return results, errors
+
+
+def merge_rows(results, name_key, sort='instance'):
+    """Flatten per-instance lists of dicts into one list, each row tagged with ``instance``."""
+    rows = [dict(row, instance=instance.name) for instance, items in results for row in items]
+    if sort == 'name':
+        rows.sort(key=lambda row: (str(row.get(name_key) or '').lower(), row['instance']))
+    return rows
@@ -0,0 +1,246 @@
+import hashlib
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from urllib.parse import unquote
+
+DEFAULT_FOLDER_DEPTH = 3
+# Only what core/partials/jenkins_jobs.html renders
+JOB_FIELDS = 'name,url,color'
+
+
+class Job:
+    __slots__ = ('name', 'url', 'color', 'instance')
+
+    def __init__(self, name, url, color=None, instance=None):
+        self.name = name
+        self.url = url
+        self.color = color
+        # Name of the controller the job lives on, set when indexing
+        self.instance = instance
+
+    def __eq__(self, other):
+        return isinstance(other, Job) and (self.name, self.url, self.color, self.instance) == (other.name, other.url, other.color, other.instance)
+
+    def __repr__(self):
+        return f"Job({self.name!r}, {self.color!r})"
+
+    @property
+    def dom_id(self):
+        # Stable HTML id for out-of-band row updates
+        key = f"{self.instance}/{self.name}" if self.instance else self.name
+        return 'jenkins-job-' + hashlib.md5(key.encode('utf-8')).hexdigest()[:12]
+
+
+def jobs_tree(depth):
+    """Build a ``tree=`` projection that includes folder contents ``depth`` levels deep."""
+    tree = f'jobs[{JOB_FIELDS}]'
+    for _ in range(depth):
+        tree = f'jobs[{JOB_FIELDS},{tree}]'
+    return tree
+
+
+def fetch_jobs(server, depth=DEFAULT_FOLDER_DEPTH):
+    """Fetch every job up to ``depth`` folders deep in a single request.
+
+    Folders whose contents were fetched are flattened into their children
+    (named ``folder/job``); folders at the depth limit are kept as rows.
+    """
+    data = server.get_info(query=f'?tree={jobs_tree(depth)}')
+    jobs = []
+    stack = [('', data.get('jobs', []))]
+    while stack:
+        prefix, items = stack.pop()
+        for item in items:
+            name = prefix + item.get('name', '')
+            if 'jobs' in item:
+                stack.append((name + '/', item['jobs']))
+            else:
+                jobs.append(Job(name, item.get('url', ''), item.get('color')))
+    return jobs
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+SORTS = ('name', 'status', 'instance')
+# Failing and unstable jobs first when sorting by status
+STATUS_ORDER = ('red', 'yellow', 'aborted', 'notbuilt', 'disabled', 'grey', 'blue', 'folder')
+
+
+def job_status(color):
+    if not color:
+        return 'folder'
+    # "_anime" marks a build in progress, it does not change the status
+    return color[:-len('_anime')] if color.endswith('_anime') else color
+
+
+class JobIndex:
+    """Lookup structures built once per job snapshot.
+
+    Jobs are kept sorted by name; ``by_status`` maps a status to the positions of
+    its jobs and ``segments`` is a sorted list of ``(path segment, position)``
+    used for prefix search with ``bisect``.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = sorted(jobs, key=lambda job: job.name.lower())
+        self.names = [job.name.lower() for job in self.jobs]
+        self.by_status = {}
+        segments = []
+        for pos, job in enumerate(self.jobs):
+            self.by_status.setdefault(job_status(job.color), []).append(pos)
+            for segment in self.names[pos].split('/'):
+                segments.append((segment, pos))
+        segments.sort()
+        self.segments = segments
+        self.status_positions = [
+            pos
+            for status in sorted(self.by_status, key=_status_rank)
+            for pos in self.by_status[status]
+        ]
+        self.instance_positions = sorted(range(len(self.jobs)), key=lambda pos: self.jobs[pos].instance or '')
+        digest = hashlib.blake2b(digest_size=8)
+        for job in self.jobs:
+            digest.update(f"{job.instance}\0{job.name}\0{job.color}\n".encode('utf-8'))
+        self.fingerprint = digest.hexdigest()
+
+    def status_counts(self):
+        return [(status, len(self.by_status[status])) for status in sorted(self.by_status, key=_status_rank)]
+
+    def search(self, query):
+        """Positions of jobs whose name, or any folder/job segment of it, starts with ``query``."""
+        query = query.lower()
+        if '/' in query:
+            start = bisect_left(self.names, query)
+            end = bisect_left(self.names, query + '\uffff')
+            return set(range(start, end))
+        start = bisect_left(self.segments, (query,))
+        end = bisect_left(self.segments, (query + '\uffff',))
+        return {pos for _, pos in self.segments[start:end]}
+
+    def query(self, q='', status='', sort='name'):
+        if sort == 'status':
+            positions = self.status_positions
+        elif sort == 'instance':
+            positions = self.instance_positions
+        else:
+            positions = range(len(self.jobs))
+        if status:
+            wanted = set(self.by_status.get(status, ()))
+            positions = [pos for pos in positions if pos in wanted]
+        if q:
+            matches = self.search(q)
+            positions = [pos for pos in positions if pos in matches]
+        return _JobList(self.jobs, positions)
+
+
+class _JobList:
+    # Lets Paginator slice positions without materialising every matching job
+    def __init__(self, jobs, positions):
+        self.jobs = jobs
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def count(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.jobs[pos] for pos in self.positions[index]]
+        return self.jobs[self.positions[index]]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+MAX_INDEXES = 8
+
+
+def get_job_index(parts):
+    """Return the ``JobIndex`` over one or more snapshot entries.
+
+    ``parts`` is a list of ``(instance, key, entry)``; jobs are tagged with their
+    instance name. The index is built only once per combination of snapshots.
+    """
+    index_key = tuple((instance, key, entry.get('updated_at', entry['fetched_at'])) for instance, key, entry in parts)
+    with _indexes_lock:
+        index = _indexes.get(index_key)
+        if index is not None:
+            _indexes.move_to_end(index_key)
+            return index
+    index = JobIndex([
+        Job(job.name, job.url, job.color, instance)
+        for instance, _, entry in parts
+        for job in entry['data']
+    ])
+    with _indexes_lock:
+        _indexes[index_key] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _status_rank(status):
+    return (STATUS_ORDER.index(status) if status in STATUS_ORDER else len(STATUS_ORDER), status)
+
+
+# Build result (Notification plugin) -> ball color
+RESULT_COLORS = {
+    'SUCCESS': 'blue',
+    'FAILURE': 'red',
+    'UNSTABLE': 'yellow',
+    'ABORTED': 'aborted',
+    'NOT_BUILT': 'notbuilt',
+}
+
+
+def parse_notification(payload):
+    """Return ``(job name, phase, result)`` from a Notification plugin payload.
+
+    The full folder path comes from the job url (``job/team/job/build/``), the
+    bare ``name`` is only a fallback.
+    """
+    build = payload.get('build') or {}
+    parts = [p for p in (payload.get('url') or '').strip('/').split('/') if p]
+    if parts and parts[0] == 'job':
+        name = '/'.join(unquote(p) for p in parts[1::2])
+    else:
+        name = payload.get('name')
+    if not name or not build.get('phase'):
+        raise ValueError("not a build notification")
+    return name, build['phase'], build.get('status')
+
+
+def apply_notification(jobs, name, phase, result, url=''):
+    """Return ``jobs`` with the color of ``name`` updated for a build event, adding the job if it is new."""
+    jobs = list(jobs)
+    pos = next((i for i, job in enumerate(jobs) if job.name == name), None)
+    current = job_status(jobs[pos].color) if pos is not None else 'notbuilt'
+    if phase == 'STARTED':
+        color = current + '_anime'
+    elif phase in ('COMPLETED', 'FINALIZED'):
+        color = RESULT_COLORS.get(result, current)
+    else:
+        return jobs
+    if pos is None:
+        jobs.append(Job(name, url, color))
+    else:
+        jobs[pos] = Job(name, jobs[pos].url, color)
+    return jobs
+
+
+def parse_job_view(params):
+    """Normalise page/page_size/sort/q/status request values."""
+    view = {
+        'q': (params.get('q') or '').strip(),
+        'status': params.get('status') or '',
+        'sort': params.get('sort') if params.get('sort') in SORTS else 'name',
+        'page': params.get('page') or '1',
+    }
+    try:
+        page_size = int(params.get('page_size') or DEFAULT_PAGE_SIZE)
+    except (TypeError, ValueError):
+        page_size = DEFAULT_PAGE_SIZE
+    view['page_size'] = max(1, min(page_size, MAX_PAGE_SIZE))
+    return view
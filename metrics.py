@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Bytes received from Jenkins per call
+PAYLOAD_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # The last slot is +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """Per-process call metrics: latency and payload histograms, error and cache counters.
+
+    Each worker process keeps its own numbers, like any Prometheus client
+    without a multiprocess collector.
+    """
+
+    def __init__(self):
+        self.latency = {}
+        self.payload = {}
+        self.errors = {}
+        self.cache = {}
+        self._lock = threading.Lock()
+
+    def observe(self, operation, seconds, payload=None, error=None):
+        with self._lock:
+            histogram = self.latency.get(operation)
+            if histogram is None:
+                histogram = self.latency[operation] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            if payload is not None:
+                histogram = self.payload.get(operation)
+                if histogram is None:
+                    histogram = self.payload[operation] = Histogram(PAYLOAD_BUCKETS)
+                histogram.observe(payload)
+            if error is not None:
+                key = (operation, error)
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def count_cache(self, name, result):
+        with self._lock:
+            key = (name, result)
+            self.cache[key] = self.cache.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self.latency.clear()
+            self.payload.clear()
+            self.errors.clear()
+            self.cache.clear()
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        with self._lock:
+            lines = []
+            _render_histogram(lines, 'jenkins_call_duration_seconds', 'Duration of Jenkins and Docker calls.', self.latency)
+            _render_histogram(lines, 'jenkins_call_payload_bytes', 'Bytes received from Jenkins per call.', self.payload)
+            lines.append('# HELP jenkins_call_errors_total Failed Jenkins and Docker calls.')
+            lines.append('# TYPE jenkins_call_errors_total counter')
+            for (operation, error), count in sorted(self.errors.items()):
+                lines.append(f'jenkins_call_errors_total{{operation="{_escape(operation)}",error="{_escape(error)}"}} {count}')
+            lines.append('# HELP jenkins_cache_requests_total Cache lookups by result (hit, stale or miss).')
+            lines.append('# TYPE jenkins_cache_requests_total counter')
+            for (name, result), count in sorted(self.cache.items()):
+                lines.append(f'jenkins_cache_requests_total{{cache="{_escape(name)}",result="{result}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _render_histogram(lines, metric, help_text, histograms):
+    lines.append(f'# HELP {metric} {help_text}')
+    lines.append(f'# TYPE {metric} histogram')
+    for operation, histogram in sorted(histograms.items()):
+        label = f'operation="{_escape(operation)}"'
+        for bound, count in histogram.cumulative():
+            le = '+Inf' if bound == float('inf') else str(bound)
+            lines.append(f'{metric}_bucket{{{label},le="{le}"}} {count}')
+        lines.append(f'{metric}_sum{{{label}}} {histogram.sum}')
+        lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+_local = threading.local()
+
+
+def slow_call_threshold():
+    # Seconds; unset (the default) turns the slow-call log off
+    ms = getattr(settings, 'JENKINS_SLOW_CALL_MS', None)
+    return ms / 1000 if ms else None
+
+
+@contextmanager
+def timed(operation):
+    """Record the duration, received bytes and failure (if any) of the enclosed call."""
+    calls = getattr(_local, 'calls', None)
+    if calls is None:
+        calls = _local.calls = []
+    # Bytes read by record_payload() while this call runs
+    calls.append(None)
+    error = None
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        payload = calls.pop()
+        registry.observe(operation, elapsed, payload, error)
+        threshold = slow_call_threshold()
+        if threshold is not None and elapsed >= threshold:
+            logger.warning("Slow call %s took %.0f ms%s", operation, elapsed * 1000, f" ({error})" if error else "")
+
+
+def record_payload(size):
+    calls = getattr(_local, 'calls', None)
+    if calls:
+        calls[-1] = (calls[-1] or 0) + size
+
+
+def record_cache(name, result):
+    registry.count_cache(name, result)
+
+
+def response_size(response):
+    if getattr(response, '_content_consumed', False) and isinstance(response.content, bytes):
+        return len(response.content)
+    try:
+        return int(response.headers.get('Content-Length') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def operation_name(method, args):
+    # get_info serves everything from /computer to job paths: label by the top-level item only
+    if method == 'get_info':
+        item = args[0] if args else ''
+        return f"get_info:{str(item).split('/')[0] or 'root'}"
+    return method
+
+
+class InstrumentedClient:
+    """A python-jenkins client whose public method calls are timed.
+
+    Private attributes (``_session``) and plain values (``server``, ``auth``)
+    pass through untouched.
+    """
+
+    def __init__(self, server):
+        object.__setattr__(self, '_server', server)
+
+    def __getattr__(self, name):
+        attr = getattr(self._server, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with timed(operation_name(name, args)):
+                return attr(*args, **kwargs)
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._server, name, value)
+
+
+def measure_responses(server):
+    """Count the bytes of every response ``server`` receives towards the running ``timed`` call."""
+    handler = server._response_handler
+
+    def measured(response):
+        record_payload(response_size(response))
+        return handler(response)
+    server._response_handler = measured
+    return server
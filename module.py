@@ -1,13 +1,76 @@
 import jenkins as python_jenkins
 import re
-import time
 import threading
 import os
 import subprocess
+import hashlib
+import sqlite3
+from concurrent.futures import wait
+from urllib.parse import urlencode
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import Paginator
+from django.http import HttpResponse, HttpResponseNotModified
 from django.shortcuts import render, redirect
 from django.urls import path
 from core.plugin_system import BaseModule
 from core.docker_cli_wrapper import DockerCLI
+from .client import get_tool_client, invalidate_clients, jenkins_url, api_executor, get_breaker, is_unreachable_error
+from .snapshots import load_snapshot, DEFAULT_TTL
+from .containers import resolve_version, status_cache
+from .installer import (
+    wait_for_initial_password, prepare_host, provision_plugins, install_scheduler, InstallProgress, PLUGIN_CACHE_DIR,
+)
+from .readiness import ReadinessProbe, ProbeError, ProbeTimeout
+from .jobs import fetch_jobs, get_job_index, parse_job_view, DEFAULT_FOLDER_DEPTH
+from .sampler import get_sampler, SAMPLE_INTERVAL
+from .history import schedule_sync, job_stats, DEFAULT_WINDOW_DAYS
+from .plugins import load_inventory, get_update_center, plugin_diff, UPDATE_CENTER_URL
+from .metrics import timed, InstrumentedClient
+from .instances import get_instances, fan_out, merge_rows, CredentialsMissing, ControllerUnavailable, ROW_SORTS
+
+JOB_VIEW_PARAMS = ('page', 'page_size', 'sort', 'q', 'status')
+# How long the rows sent for a jobs page are remembered for delta refreshes
+JOB_ROWS_TTL = 600
+JOBS_POLL_INTERVAL = 10
+JOBS_RECONCILE_INTERVAL = 120
+TABS = ('jenkins_jobs', 'jenkins_nodes', 'jenkins_plugins', 'jenkins_overview')
+OVERVIEW_SECTIONS = ('jobs', 'nodes', 'plugins', 'queue')
+# Sections not ready by then are rendered as lazy placeholders
+OVERVIEW_TIMEOUT = 5
+
+_module_version = None
+_module_version_lock = threading.Lock()
+
+# (controller url, section) -> future. A placeholder's poll waits on the fetch
+# already running instead of starting another one.
+_overview_fetches = {}
+_overview_lock = threading.Lock()
+
+
+def get_module_version():
+    # Resolved once per process: the shipped VERSION file, then git as a last resort
+    global _module_version
+    if _module_version is None:
+        with _module_version_lock:
+            if _module_version is None:
+                _module_version = _read_module_version()
+    return _module_version
+
+
+def _read_module_version():
+    try:
+        with open(os.path.join(os.path.dirname(__file__), 'VERSION')) as f:
+            version = f.read().strip()
+            if version:
+                return version
+    except OSError:
+        pass
+    try:
+        return subprocess.check_output(['git', '-C', os.path.dirname(__file__), 'describe', '--tags', '--abbrev=0'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "1.0.0"
+
 
 class Module(BaseModule):
     @property
@@ -22,54 +85,56 @@ class Module(BaseModule):
     
     @property
     def version(self):
-        try:
-            return subprocess.check_output(['git', '-C', os.path.dirname(__file__), 'describe', '--tags', '--abbrev=0']).decode().strip()
-        except:
-            return "1.0.0"
+        return get_module_version()
 
     def get_service_version(self):
         try:
-            # Try to get version from the running container if possible
-            # Jenkins version is usually in the footer or available via API
-            # But we can also check the image tag or run a command in container
-            client = DockerCLI()
-            container = client.containers.get('jenkins')
-            if container and container.status == 'running':
-                # Run 'java -jar /usr/share/jenkins/jenkins.war --version'
-                res = container.exec_run("java -jar /usr/share/jenkins/jenkins.war --version")
-                if res.exit_code == 0:
-                    return res.output.decode().strip()
+            entry = status_cache.get('jenkins', self._inspect_container)
+            if entry['status'] == 'running' and entry['container']:
+                # Image env / X-Jenkins header first, memoized per container and image
+                return resolve_version(entry['container'])
         except Exception:
             pass
         return None
 
     def get_service_status(self, tool):
-        try:
-            client = DockerCLI()
-            container = client.containers.get(tool.config_data.get('container_name', 'jenkins'))
-            if container:
-                return 'running' if container.status == 'running' else 'stopped'
-            return 'stopped'
-        except Exception:
-            return 'stopped'
+        # Kept up to date by docker events, see containers.ContainerStatusCache
+        return status_cache.status(tool.config_data.get('container_name', 'jenkins'), self._inspect_container)
+
+    def _inspect_container(self, name):
+        client = DockerCLI()
+        with timed('docker.containers.get'):
+            return client.containers.get(name)
 
     def service_start(self, tool):
         client = DockerCLI()
-        container = client.containers.get(tool.config_data.get('container_name', 'jenkins'))
+        container_name = tool.config_data.get('container_name', 'jenkins')
+        with timed('docker.containers.get'):
+            container = client.containers.get(container_name)
         if container:
-            container.start()
+            with timed('docker.container.start'):
+                container.start()
+            status_cache.set_status(container_name, 'running')
 
     def service_stop(self, tool):
         client = DockerCLI()
-        container = client.containers.get(tool.config_data.get('container_name', 'jenkins'))
+        container_name = tool.config_data.get('container_name', 'jenkins')
+        with timed('docker.containers.get'):
+            container = client.containers.get(container_name)
         if container:
-            container.stop()
+            with timed('docker.container.stop'):
+                container.stop()
+            status_cache.set_status(container_name, 'stopped')
 
     def service_restart(self, tool):
         client = DockerCLI()
-        container = client.containers.get(tool.config_data.get('container_name', 'jenkins'))
+        container_name = tool.config_data.get('container_name', 'jenkins')
+        with timed('docker.containers.get'):
+            container = client.containers.get(container_name)
         if container:
-            container.restart()
+            with timed('docker.container.restart'):
+                container.restart()
+            status_cache.set_status(container_name, 'running')
 
     def get_install_template_name(self):
         return "core/modules/jenkins_install.html"
@@ -89,20 +154,29 @@ class Module(BaseModule):
             {
                 'id': 'jenkins_jobs', 
                 'label': 'Jobs', 
-                'hx_get': '/tool/jenkins/?tab=jenkins_jobs', 
-                'hx_auto_refresh': 'load, every 10s',
+                'hx_get': f'/tool/{self.module_id}/?tab=jenkins_jobs', 
+                # The partial polls itself for changes, see jenkins_jobs_poll.html
+                'hx_auto_refresh': 'load',
                 'template': 'core/modules/jenkins_loading.html'
             },
             {
                 'id': 'jenkins_nodes', 
                 'label': 'Nodes', 
-                'hx_get': '/tool/jenkins/?tab=jenkins_nodes',
+                'hx_get': f'/tool/{self.module_id}/?tab=jenkins_nodes',
+                # Served from the sampler's memory, see sampler.py
+                'hx_auto_refresh': f'load, every {SAMPLE_INTERVAL}s',
                 'template': 'core/modules/jenkins_loading.html'
             },
             {
                 'id': 'jenkins_plugins', 
                 'label': 'Plugins', 
-                'hx_get': '/tool/jenkins/?tab=jenkins_plugins',
+                'hx_get': f'/tool/{self.module_id}/?tab=jenkins_plugins',
+                'template': 'core/modules/jenkins_loading.html'
+            },
+            {
+                'id': 'jenkins_overview',
+                'label': 'Overview',
+                'hx_get': f'/tool/{self.module_id}/?tab=jenkins_overview',
                 'template': 'core/modules/jenkins_loading.html'
             },
         ]
@@ -110,228 +184,470 @@ class Module(BaseModule):
     def get_context_data(self, request, tool):
         context = {}
         if tool.status == 'installed':
-            try:
-                port = tool.config_data.get('port', '8080')
-                jenkins_url = f"http://localhost:{port}"
-                username = tool.config_data.get('username', 'admin')
-                password = tool.config_data.get('api_token') or tool.config_data.get('password')
-                
-                if password:
-                    server = python_jenkins.Jenkins(jenkins_url, username=username, password=password)
-                    
-                    target = request.GET.get('tab')
-                    if target == 'jenkins_nodes':
-                        context['jenkins_nodes'] = server.get_nodes()
-                    elif target == 'jenkins_plugins':
-                        context['jenkins_plugins'] = server.get_plugins_info()
-                    else:
-                        context['jenkins_jobs'] = server.get_jobs()
-                    
-                    context['jenkins_connected'] = True
+            instances = get_instances(tool)
+            context['jenkins_instances'] = instances
+            target = request.GET.get('tab')
+            sort = request.GET.get('sort') if request.GET.get('sort') in ROW_SORTS else 'instance'
+            if target == 'jenkins_nodes':
+                fetch = self.load_nodes
+            elif target == 'jenkins_plugins':
+                fetch = self.load_plugins
+            elif target == 'jenkins_overview':
+                # The overview describes the tool's own controller
+                instances = instances[:1]
+                section = request.GET.get('section')
+                if section in OVERVIEW_SECTIONS:
+                    context['jenkins_overview_section'] = section
+                    fetch = lambda instance, server: self.get_overview(instance, server, (section,))
                 else:
-                    context['jenkins_auth_required'] = True
-            except Exception as e:
-                error_msg = str(e)
-                if "401" in error_msg or "Unauthorized" in error_msg:
-                    context['jenkins_auth_error'] = True
-                context['jenkins_error'] = error_msg.split('\n')[0] # Only show the first line of the error
+                    fetch = lambda instance, server: self.get_overview(instance, server, OVERVIEW_SECTIONS)
+            else:
+                fetch = self.load_jobs
+
+            # Only known tabs become metric labels
+            with timed(f"tab:{target if target in TABS else 'jenkins_jobs'}"):
+                results, errors = fan_out(instances, lambda instance: self.call_instance(instance, fetch))
+            if results:
+                context['jenkins_connected'] = True
+                if target == 'jenkins_nodes':
+                    context['jenkins_nodes'] = merge_rows([(instance, data['nodes']) for instance, data in results], 'name', sort)
+                    context['jenkins_queues'] = [dict(data['queue'], instance=instance.name) for instance, data in results]
+                elif target == 'jenkins_plugins':
+                    plugins = merge_rows(results, 'shortName', sort)
+                    context['jenkins_plugins'] = plugins
+                    context['jenkins_plugin_updates'] = sum(1 for p in plugins if p['update'])
+                    context['jenkins_plugin_conflicts'] = sum(1 for p in plugins if p['conflicts'])
+                elif target == 'jenkins_overview':
+                    context.update(results[0][1])
+                else:
+                    index = get_job_index([(instance.name, key, entry) for instance, (key, entry) in results])
+                    context.update(self.get_jobs_page(request, index))
+                    window = int(tool.config_data.get('history_window_days', DEFAULT_WINDOW_DAYS))
+                    context['jenkins_job_rows'] = self.get_job_rows(context['jenkins_jobs'], [i for i, _ in results], window)
+                    context['jenkins_history_window'] = window
+                    # With build notifications pushed in, polling only reconciles
+                    context['jenkins_jobs_poll_interval'] = JOBS_RECONCILE_INTERVAL if tool.config_data.get('webhook_token') else JOBS_POLL_INTERVAL
+
+            if len(instances) == 1 and errors:
+                context.update(self.error_context(errors[0][1]))
+            else:
+                context['jenkins_instance_errors'] = [
+                    dict(self.error_context(error), instance=instance.name) for instance, error in errors
+                ]
         return context
 
+    def call_instance(self, instance, fetch):
+        server = get_tool_client(instance)
+        if not server:
+            raise CredentialsMissing()
+        breaker = get_breaker(jenkins_url(instance))
+        if not breaker.allow():
+            # Known to be down: answer right away instead of waiting on timeouts
+            raise ControllerUnavailable(breaker)
+        try:
+            result = fetch(instance, server)
+        except Exception as e:
+            if is_unreachable_error(e):
+                self.record_unreachable(instance, e)
+            raise
+        breaker.record_success()
+        return result
+
+    def error_context(self, error):
+        if isinstance(error, CredentialsMissing):
+            return {'jenkins_auth_required': True}
+        if isinstance(error, ControllerUnavailable):
+            return {
+                'jenkins_unreachable': True,
+                'jenkins_unreachable_reason': error.reason,
+                'jenkins_retry_in': error.retry_in,
+            }
+        error_msg = str(error)
+        context = {'jenkins_error': error_msg.split('\n')[0]} # Only show the first line of the error
+        if "401" in error_msg or "Unauthorized" in error_msg:
+            context['jenkins_auth_error'] = True
+        return context
+
+    def record_unreachable(self, tool, error):
+        breaker = get_breaker(jenkins_url(tool))
+        # Controllers configured by URL have no local container to check
+        if not tool.config_data.get('url') and self.get_service_status(tool) != 'running':
+            breaker.record_failure("Jenkins container is not running", trip=True)
+        else:
+            breaker.record_failure(str(error).split('\n')[0])
+
+    def load_nodes(self, tool, server):
+        sampler = get_sampler(tool)
+        if sampler.sampled_at is None:
+            # First view: take the first sample right away, the sampler thread does the rest
+            sampler.sample(server)
+        return sampler.snapshot()
+
+    def load_plugins(self, tool, server):
+        core, plugins = load_inventory(jenkins_url(tool), server)
+        update_center = get_update_center(core, tool.config_data.get('update_center_url') or UPDATE_CENTER_URL)
+        return plugin_diff(plugins, update_center, core)
+
+    def load_jobs(self, tool, server):
+        key = f"jenkins:jobs:{jenkins_url(tool)}"
+        depth = int(tool.config_data.get('folder_depth', DEFAULT_FOLDER_DEPTH))
+        entry = load_snapshot(
+            key,
+            lambda: fetch_jobs(server, depth),
+            ttl=int(tool.config_data.get('jobs_cache_ttl', DEFAULT_TTL)),
+        )
+        # Build history is ingested incrementally next to the job list
+        schedule_sync(jenkins_url(tool), server, depth)
+        return key, entry
+
+    def get_job_rows(self, jobs, instances, window):
+        """Pair each job on the page with its build stats from the history store."""
+        urls = {instance.name: jenkins_url(instance) for instance in instances}
+        stats = {}
+        try:
+            for name, url in urls.items():
+                names = [job.name for job in jobs if job.instance == name]
+                stats[name] = job_stats(url, names, window)
+        except (sqlite3.Error, ImproperlyConfigured):
+            pass
+        return [(job, stats.get(job.instance, {}).get(job.name)) for job in jobs]
+
+    def get_overview(self, tool, server, sections):
+        fetchers = {
+            'jobs': lambda: get_job_index([(tool.name, *self.load_jobs(tool, server))]).status_counts(),
+            'nodes': lambda: server.get_info('computer', '?tree=busyExecutors,totalExecutors,computer[displayName,offline]'),
+            'plugins': lambda: server.get_info('pluginManager', '?tree=plugins[enabled,hasUpdate]')['plugins'],
+            'queue': lambda: server.get_info('queue', '?tree=items[why,inQueueSince,task[name]]')['items'],
+        }
+        url = jenkins_url(tool)
+        futures = {}
+        with _overview_lock:
+            for name in sections:
+                future = _overview_fetches.get((url, name))
+                # A result that finished unseen is only picked up by its placeholder's poll
+                if future is None or (future.done() and len(sections) > 1):
+                    future = _overview_fetches[(url, name)] = api_executor.submit(fetchers[name])
+                futures[future] = name
+        done, pending = wait(futures, timeout=OVERVIEW_TIMEOUT)
+        with _overview_lock:
+            for future in done:
+                if _overview_fetches.get((url, futures[future])) is future:
+                    del _overview_fetches[(url, futures[future])]
+
+        overview = {}
+        errors = {}
+        for future in done:
+            try:
+                overview[futures[future]] = future.result()
+            except Exception as e:
+                errors[futures[future]] = str(e).split('\n')[0]
+                if is_unreachable_error(e):
+                    self.record_unreachable(tool, e)
+        if 'nodes' in overview:
+            computers = overview['nodes'].get('computer', [])
+            overview['nodes'] = {
+                'total': len(computers),
+                'offline': sum(1 for c in computers if c.get('offline')),
+                'busy_executors': overview['nodes'].get('busyExecutors', 0),
+                'total_executors': overview['nodes'].get('totalExecutors', 0),
+            }
+        if 'plugins' in overview:
+            plugins = overview['plugins']
+            overview['plugins'] = {
+                'total': len(plugins),
+                'enabled': sum(1 for p in plugins if p.get('enabled')),
+                'updates': sum(1 for p in plugins if p.get('hasUpdate')),
+            }
+        return {
+            'jenkins_overview': overview,
+            'jenkins_overview_errors': errors,
+            'jenkins_overview_pending': [futures[future] for future in pending],
+            'jenkins_overview_sections': sections,
+        }
+
+    def get_jobs_page(self, request, index):
+        params = {}
+        for name in JOB_VIEW_PARAMS:
+            value = request.GET.get(name)
+            if isinstance(value, str):
+                params[name] = value
+        # Auto-refresh polls carry no view params: keep the page the user is on
+        session = getattr(request, 'session', None)
+        if params:
+            # Polls re-send the same params: don't rewrite the session every time
+            if session is not None and session.get('jenkins_jobs_view') != params:
+                session['jenkins_jobs_view'] = params
+        elif session is not None and isinstance(session.get('jenkins_jobs_view'), dict):
+            params = session['jenkins_jobs_view']
+
+        view = parse_job_view(params)
+        page = Paginator(index.query(view['q'], view['status'], view['sort']), view['page_size']).get_page(view['page'])
+        query = urlencode({k: view[k] for k in ('page_size', 'sort', 'q', 'status')})
+        etag = hashlib.blake2b(f"{index.fingerprint}|{page.number}|{query}".encode('utf-8'), digest_size=8).hexdigest()
+        return {
+            'jenkins_jobs': list(page.object_list),
+            'jenkins_jobs_page': page,
+            'jenkins_jobs_view': view,
+            'jenkins_jobs_query': query,
+            'jenkins_jobs_etag': etag,
+            'jenkins_jobs_total': len(index.jobs),
+            'jenkins_job_statuses': index.status_counts(),
+        }
+
     def handle_hx_request(self, request, tool, target):
         context = self.get_context_data(request, tool)
         context['tool'] = tool
         if target == 'jenkins_jobs':
-            return render(request, 'core/partials/jenkins_jobs.html', context)
+            return self.render_jobs(request, context)
         elif target == 'jenkins_nodes':
             return render(request, 'core/partials/jenkins_nodes.html', context)
         elif target == 'jenkins_plugins':
             return render(request, 'core/partials/jenkins_plugins.html', context)
+        elif target == 'jenkins_overview':
+            if context.get('jenkins_overview_section'):
+                context['section'] = context['jenkins_overview_section']
+                return render(request, 'core/partials/jenkins_overview_section.html', context)
+            return render(request, 'core/partials/jenkins_overview.html', context)
         return None
 
+    def render_jobs(self, request, context):
+        etag = context.get('jenkins_jobs_etag')
+        if not etag:
+            return render(request, 'core/partials/jenkins_jobs.html', context)
+
+        # "since" is the etag of the page the polling browser currently shows
+        since = request.GET.get('since')
+        if since == etag:
+            return HttpResponse(status=204)
+        if request.headers.get('If-None-Match') == f'"{etag}"':
+            return HttpResponseNotModified()
+
+        rows = [(job.dom_id, job.color) for job in context['jenkins_jobs']]
+        cache.set(f"jenkins:jobs:rows:{etag}", rows, JOB_ROWS_TTL)
+        previous = cache.get(f"jenkins:jobs:rows:{since}") if since else None
+        if previous is not None and [name for name, _ in previous] == [name for name, _ in rows]:
+            # Same rows on the page: only swap the statuses that changed
+            colors = dict(previous)
+            context['jenkins_changed_jobs'] = [job for job in context['jenkins_jobs'] if colors.get(job.dom_id) != job.color]
+            response = render(request, 'core/partials/jenkins_jobs_delta.html', context)
+            response['HX-Reswap'] = 'none'
+            response['Cache-Control'] = 'no-store'
+            return response
+
+        response = render(request, 'core/partials/jenkins_jobs.html', context)
+        response['ETag'] = f'"{etag}"'
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
     def install(self, request, tool):
         if tool.status == 'error' and request.method == 'GET':
+            # Checkpoints are kept so the next attempt skips finished stages
             tool.status = 'not_installed'
             tool.save()
             return
 
+        if tool.status == 'installing' and request.method == 'GET':
+            # Resume an install interrupted by a restart of this process
+            if tool.config_data.get('install') and not install_scheduler.is_running(tool):
+                install_scheduler.submit(tool, lambda: self.run_install(tool))
+            return
+
         if tool.status not in ['not_installed', 'error'] and request.method != 'POST':
             return
 
         if request.method == 'POST':
-            port = request.POST.get('port', '8080')
-            jnlp_port = request.POST.get('jnlp_port', '50000')
-            volume_name = request.POST.get('volume_name', 'jenkins_home')
-            container_name = request.POST.get('container_name', 'jenkins')
-            privileged = request.POST.get('privileged') == 'on'
+            if install_scheduler.is_running(tool):
+                return
+
+            params = {
+                'port': request.POST.get('port', '8080'),
+                'jnlp_port': request.POST.get('jnlp_port', '50000'),
+                'volume_name': request.POST.get('volume_name', 'jenkins_home'),
+                'container_name': request.POST.get('container_name', 'jenkins'),
+                'plugin_cache_volume': request.POST.get('plugin_cache_volume', 'jenkins_plugin_cache'),
+                'privileged': request.POST.get('privileged') == 'on',
+            }
+            state = tool.config_data.get('install')
+            if not state or state.get('params') != params:
+                # Different settings: nothing finished so far can be reused
+                state = {'params': params, 'completed': []}
+            tool.config_data['install'] = state
 
             tool.status = 'installing'
             tool.save()
 
-            def run_jenkins_install():
-                try:
-                    client = DockerCLI()
-                    tool.current_stage = "Checking for Docker..."
-                    tool.save()
-                    
-                    # Ensure volume exists
-                    tool.current_stage = f"Creating volume {volume_name}..."
-                    tool.save()
-                    client.volumes.create(name=volume_name)
-
-                    # Ensure network exists
-                    tool.current_stage = "Creating network jenkins_network..."
-                    tool.save()
-                    if not client.networks.get("jenkins_network"):
-                        client.networks.create("jenkins_network", driver="bridge")
-
-                    # Pull image
-                    tool.current_stage = "Pulling Jenkins image (jenkins/jenkins:lts)..."
-                    tool.save()
-                    client.images.pull("jenkins/jenkins", tag="lts")
-
-                    # Run container
-                    tool.current_stage = "Starting Jenkins container..."
-                    tool.save()
-                    
-                    ports = {
-                        '8080/tcp': port,
-                        '50000/tcp': jnlp_port
-                    }
-                    
-                    volumes = {
-                        volume_name: {'bind': '/var/jenkins_home', 'mode': 'rw'}
-                    }
+            install_scheduler.submit(tool, lambda: self.run_install(tool))
 
+    def run_install(self, tool):
+        state = tool.config_data['install']
+        params = state['params']
+        completed = state['completed']
+        port = params['port']
+        progress = InstallProgress(tool)
+
+        def checkpoint(stage, *fields):
+            if stage not in completed:
+                completed.append(stage)
+            progress.save('config_data', *fields)
+
+        try:
+            client = DockerCLI()
+            if completed:
+                progress.stage(f"Resuming installation after '{completed[-1]}'...")
+            else:
+                progress.stage("Checking for Docker...")
+
+            # Volume, network and image don't depend on each other
+            prepare_host(
+                client, [params['volume_name'], params['plugin_cache_volume']], progress.stage,
+                completed=completed, checkpoint=checkpoint,
+            )
+
+            container = None
+            if 'container' in completed:
+                with timed('docker.containers.get'):
+                    container = client.containers.get(params['container_name'])
+                if container and container.status != 'running':
+                    with timed('docker.container.start'):
+                        container.start()
+            if not container:
+                # Run container
+                progress.stage("Starting Jenkins container...")
+
+                ports = {
+                    '8080/tcp': port,
+                    '50000/tcp': params['jnlp_port']
+                }
+
+                volumes = {
+                    params['volume_name']: {'bind': '/var/jenkins_home', 'mode': 'rw'},
+                    params['plugin_cache_volume']: {'bind': PLUGIN_CACHE_DIR, 'mode': 'rw'},
+                }
+
+                with timed('docker.containers.run'):
                     container = client.containers.run(
                         "jenkins/jenkins:lts",
-                        name=container_name,
+                        name=params['container_name'],
                         ports=ports,
                         volumes=volumes,
                         detach=True,
-                        privileged=privileged,
+                        privileged=params['privileged'],
                         network="jenkins_network",
                         restart_policy={"Name": "always"}
                     )
 
-                    tool.status = 'installing'
-                    tool.current_stage = "Waiting for initial password..."
-                    tool.config_data['port'] = port
-                    tool.config_data['container_id'] = container.id
-                    tool.config_data['container_name'] = container_name
-                    tool.save()
-
-                    # Wait for initial password in logs
-                    initial_password = None
-                    for _ in range(30):
-                        logs = container.logs().decode('utf-8')
-                        match = re.search(r'Please use the following password to proceed to installation:.*?([a-f0-9]{32})', logs, re.DOTALL)
-                        if match:
-                            initial_password = match.group(1)
-                            break
-                        time.sleep(5)
-                    
-                    if initial_password:
-                        tool.current_stage = "Configuring Jenkins (setting admin/admin)..."
-                        tool.save()
-                        
-                        # Wait for Jenkins to be ready
-                        jenkins_url = f"http://localhost:{port}"
-                        server = None
-                        for _ in range(20):
-                            try:
-                                server = python_jenkins.Jenkins(jenkins_url, username='admin', password=initial_password)
-                                server.get_version()
-                                break
-                            except:
-                                time.sleep(5)
-                        
-                        if server:
-                            setup_script = """
-                            import jenkins.model.*
-                            import hudson.security.*
-                            import jenkins.install.*
-
-                            def instance = Jenkins.getInstance()
-
-                            // Set admin password
-                            def hudsonRealm = new HudsonPrivateSecurityRealm(false)
-                            hudsonRealm.createAccount("admin", "admin")
-                            instance.setSecurityRealm(hudsonRealm)
-
-                            def strategy = new FullControlOnceLoggedInAuthorizationStrategy()
-                            strategy.setAllowAnonymousRead(false)
-                            instance.setAuthorizationStrategy(strategy)
-
-                            // Disable setup wizard
-                            instance.setInstallState(InstallState.INITIAL_SETUP_COMPLETED)
-
-                            // Set Jenkins URL
-                            def location = jenkins.model.JenkinsLocationConfiguration.get()
-                            location.setUrl("http://127.0.0.1:{{PORT}}/")
-                            location.save()
-
-                            // Generate API Token for admin
-                            def user = hudson.model.User.get("admin")
-                            def prop = user.getProperty(jenkins.security.ApiTokenProperty.class)
-                            def token = prop.tokenStore.generateNewToken("SolsticeOps").plainValue
-                            user.save()
-                            
-                            // We will print the token so it can be captured by the installer
-                            println("SOLSTICE_JENKINS_TOKEN:" + token)
-
-                            // Install recommended plugins
-                            def pluginManager = instance.getPluginManager()
-                            def updateCenter = instance.getUpdateCenter()
-                            def plugins = [
-                                "workflow-aggregator", "git", "pipeline-stage-view", 
-                                "ssh-slaves", "matrix-auth", "pam-auth", "ldap", 
-                                "email-ext", "mailer", "dark-theme"
-                            ]
-                            
-                            def installed = false
-                            plugins.each { 
-                                if (!pluginManager.getPlugin(it)) {
-                                    def plugin = updateCenter.getById("default").getPlugin(it)
-                                    if (plugin) {
-                                        plugin.deploy()
-                                        installed = true
-                                    }
-                                }
-                            }
-                            if (installed) {
-                                instance.save()
-                                instance.restart()
-                            }
-
-                            instance.save()
-                            """.replace('{{PORT}}', port)
-                            # Get token from script output
-                            script_output = server.run_script(setup_script)
-                            token_match = re.search(r'SOLSTICE_JENKINS_TOKEN:([a-zA-Z0-9-]+)', script_output)
-                            if token_match:
-                                tool.config_data['api_token'] = token_match.group(1)
-                                tool.config_data['username'] = 'admin'
-                                # Remove password after getting token
-                                if 'password' in tool.config_data:
-                                    del tool.config_data['password']
-
-                            tool.status = 'installed'
-                            tool.current_stage = "Jenkins installed, configured and plugins requested"
-                        else:
-                            tool.status = 'error'
-                            tool.current_stage = "Jenkins started, but auto-config failed (timeout)"
-                    else:
-                        tool.status = 'error'
-                        tool.current_stage = "Jenkins started, but initial password not found in logs"
-
-                    tool.version = "LTS"
-                    tool.save()
-                except Exception as e:
+                tool.status = 'installing'
+                tool.current_stage = "Waiting for initial password..."
+                tool.config_data['port'] = port
+                tool.config_data['container_id'] = container.id
+                tool.config_data['container_name'] = params['container_name']
+                checkpoint('container', 'status', 'current_stage')
+
+            jenkins_url = f"http://localhost:{port}"
+            if 'configured' not in completed:
+                failure = self.configure_jenkins(tool, container, jenkins_url, progress)
+                if failure:
                     tool.status = 'error'
-                    tool.config_data['error_log'] = str(e)
-                    tool.save()
-
-            threading.Thread(target=run_jenkins_install).start()
+                    tool.current_stage = failure
+                    progress.finish()
+                    return
+                checkpoint('configured')
+
+            # Install plugins from the cache/update center, then restart once
+            installed_stage = "Jenkins installed, configured and plugins installed"
+            if 'plugins' not in completed:
+                try:
+                    changed, online = provision_plugins(container, progress.stage)
+                    if changed:
+                        progress.stage("Restarting Jenkins to load plugins...")
+                        with timed('docker.container.restart'):
+                            container.restart()
+                        token = tool.config_data.get('api_token')
+                        ReadinessProbe(jenkins_url, auth=('admin', token or 'admin')).wait()
+                    if not online:
+                        installed_stage += " (offline, from plugin cache)"
+                    checkpoint('plugins')
+                except Exception as e:
+                    installed_stage = f"Jenkins installed and configured, but plugin provisioning failed: {e}"
+
+            tool.status = 'installed'
+            tool.current_stage = installed_stage
+            tool.version = "LTS"
+            del tool.config_data['install']
+            progress.finish()
+        except Exception as e:
+            tool.status = 'error'
+            tool.config_data['error_log'] = str(e)
+            progress.finish()
+
+    def configure_jenkins(self, tool, container, jenkins_url, progress):
+        """Set admin/admin, finish the setup wizard and store an API token.
+
+        Returns an error message for the install stage, or None on success.
+        """
+        # Wait for initial password in logs
+        initial_password = wait_for_initial_password(container)
+        if not initial_password:
+            return "Jenkins started, but initial password not found in logs"
+
+        progress.stage("Configuring Jenkins (setting admin/admin)...")
+
+        # Wait for Jenkins to be ready
+        try:
+            ReadinessProbe(jenkins_url, auth=('admin', initial_password)).wait()
+        except ProbeTimeout:
+            return "Jenkins started, but auto-config failed (timeout)"
+        except ProbeError as e:
+            return f"Jenkins started, but auto-config failed ({e})"
+        server = InstrumentedClient(python_jenkins.Jenkins(jenkins_url, username='admin', password=initial_password))
+
+        setup_script = """
+        import jenkins.model.*
+        import hudson.security.*
+        import jenkins.install.*
+
+        def instance = Jenkins.getInstance()
+
+        // Set admin password
+        def hudsonRealm = new HudsonPrivateSecurityRealm(false)
+        hudsonRealm.createAccount("admin", "admin")
+        instance.setSecurityRealm(hudsonRealm)
+
+        def strategy = new FullControlOnceLoggedInAuthorizationStrategy()
+        strategy.setAllowAnonymousRead(false)
+        instance.setAuthorizationStrategy(strategy)
+
+        // Disable setup wizard
+        instance.setInstallState(InstallState.INITIAL_SETUP_COMPLETED)
+
+        // Set Jenkins URL
+        def location = jenkins.model.JenkinsLocationConfiguration.get()
+        location.setUrl("http://127.0.0.1:{{PORT}}/")
+        location.save()
+
+        // Generate API Token for admin
+        def user = hudson.model.User.get("admin")
+        def prop = user.getProperty(jenkins.security.ApiTokenProperty.class)
+        def token = prop.tokenStore.generateNewToken("SolsticeOps").plainValue
+        user.save()
+        
+        // We will print the token so it can be captured by the installer
+        println("SOLSTICE_JENKINS_TOKEN:" + token)
+
+        // Plugins are provisioned by the installer afterwards
+        instance.save()
+        """.replace('{{PORT}}', tool.config_data['port'])
+        # Get token from script output
+        script_output = server.run_script(setup_script)
+        token_match = re.search(r'SOLSTICE_JENKINS_TOKEN:([a-zA-Z0-9-]+)', script_output)
+        if token_match:
+            tool.config_data['api_token'] = token_match.group(1)
+            tool.config_data['username'] = 'admin'
+            invalidate_clients(jenkins_url)
+            # Remove password after getting token
+            if 'password' in tool.config_data:
+                del tool.config_data['password']
+        return None
 
     def get_urls(self):
         from . import views
@@ -339,4 +655,15 @@ class Module(BaseModule):
             path('jenkins/update_creds/', views.update_creds, name='update_jenkins_creds'),
             path('jenkins/change_password/', views.change_admin_password, name='change_jenkins_admin_password'),
             path('jenkins/find/', views.find_jenkins, name='find_jenkins'),
+            path('jenkins/install_progress/', views.install_progress, name='jenkins_install_progress'),
+            path('jenkins/instances/save/', views.save_instance, name='save_jenkins_instance'),
+            path('jenkins/instances/remove/', views.remove_instance, name='remove_jenkins_instance'),
+            path('jenkins/webhook/', views.job_webhook, name='jenkins_job_webhook'),
+            path('jenkins/webhook/token/', views.rotate_webhook_token, name='rotate_jenkins_webhook_token'),
+            path('jenkins/events/', views.job_events, name='jenkins_job_events'),
+            path('jenkins/console/', views.build_console, name='jenkins_build_console'),
+            path('jenkins/console/stream/', views.build_console_stream, name='jenkins_build_console_stream'),
+            path('jenkins/bulk/', views.bulk_action, name='jenkins_bulk_action'),
+            path('jenkins/bulk/<str:run_id>/', views.bulk_progress, name='jenkins_bulk_progress'),
+            path('jenkins/metrics/', views.metrics, name='jenkins_metrics'),
         ]
@@ -0,0 +1,116 @@
+import hashlib
+import re
+import threading
+
+import requests
+from django.core.cache import cache
+
+from .metrics import timed, record_cache, record_payload
+from .snapshots import load_snapshot
+
+# How often the cheap fingerprint is re-checked; the full inventory is only
+# fetched again when it changes
+PLUGIN_CHECK_TTL = 60
+INVENTORY_TTL = 86400
+SHALLOW_TREE = 'plugins[shortName,version,active,enabled]'
+
+UPDATE_CENTER_URL = 'https://updates.jenkins.io/update-center.actual.json'
+UPDATE_CENTER_TTL = 86400
+# Also the delay before a failed download is tried again
+UPDATE_CENTER_RETRY = 600
+UPDATE_CENTER_TIMEOUT = (3, 30)
+
+
+def plugin_fingerprint(server):
+    """Jenkins version plus a hash of the installed plugin versions, from one light request.
+
+    The shallow ``pluginManager`` listing carries the version in its
+    ``X-Jenkins`` header; ``get_version()`` would render the whole dashboard.
+    """
+    response = server.jenkins_request(requests.Request(
+        'GET', f"{server.server.rstrip('/')}/pluginManager/api/json", params={'tree': SHALLOW_TREE},
+    ))
+    core = response.headers.get('X-Jenkins')
+    plugins = response.json().get('plugins', [])
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(str(core).encode('utf-8'))
+    for plugin in sorted(plugins, key=lambda p: p.get('shortName', '')):
+        digest.update(f"\n{plugin.get('shortName')}\0{plugin.get('version')}\0{plugin.get('active')}\0{plugin.get('enabled')}".encode('utf-8'))
+    return {'fingerprint': digest.hexdigest(), 'core': core}
+
+
+def load_inventory(url, server):
+    """Return ``(jenkins version, plugins)``; the deep plugin query runs once per fingerprint."""
+    check = load_snapshot(f"jenkins:plugins:fingerprint:{url}", lambda: plugin_fingerprint(server), ttl=PLUGIN_CHECK_TTL)['data']
+    plugins = load_snapshot(
+        f"jenkins:plugins:{url}:{check['fingerprint']}", server.get_plugins_info, ttl=INVENTORY_TTL, max_stale=0,
+    )['data']
+    return check['core'], plugins
+
+
+def get_update_center(core, url=UPDATE_CENTER_URL):
+    """``{plugin: {'version', 'requiredCore'}}`` for Jenkins ``core``, or ``None`` while it is being downloaded."""
+    key = f"jenkins:update-center:{url}:{core}"
+    data = cache.get(key)
+    record_cache('update_center', 'miss' if data is None else 'hit')
+    if data is None and cache.add(f"{key}:lock", True, UPDATE_CENTER_RETRY):
+        _start_download(key, core, url)
+    return data
+
+
+def _start_download(key, core, url):
+    threading.Thread(target=_download_update_center, args=(key, core, url), daemon=True).start()
+
+
+def _download_update_center(key, core, url):
+    try:
+        with timed('update_center.download'):
+            response = requests.get(url, params={'version': core}, timeout=UPDATE_CENTER_TIMEOUT)
+            response.raise_for_status()
+            record_payload(len(response.content))
+            plugins = response.json().get('plugins', {})
+    except (requests.RequestException, ValueError):
+        # The lock stays until UPDATE_CENTER_RETRY: no retry storm while offline
+        return
+    # Only what the diff needs, a few hundred KB instead of several MB
+    cache.set(key, {
+        name: {'version': plugin.get('version'), 'requiredCore': plugin.get('requiredCore')}
+        for name, plugin in plugins.items()
+    }, UPDATE_CENTER_TTL)
+
+
+def version_key(version):
+    # Good enough for Jenkins plugin versions (1.2.3, 4.5-rc123.abc, 1234.v5678)
+    return tuple(int(n) for n in re.findall(r'\d+', str(version or '')))
+
+
+def plugin_diff(plugins, update_center=None, core=None):
+    """Annotate each plugin with ``update`` (newer version, if any) and ``conflicts``.
+
+    Without update-center data Jenkins' own ``hasUpdate`` flag is used.
+    Conflicts are required dependencies that are missing or older than needed.
+    """
+    installed = {plugin.get('shortName'): plugin.get('version') for plugin in plugins}
+    rows = []
+    for plugin in plugins:
+        row = {k: v for k, v in plugin.items() if k != 'dependencies'}
+        if update_center is not None:
+            latest = update_center.get(plugin.get('shortName')) or {}
+            newer = latest.get('version') and version_key(latest['version']) > version_key(plugin.get('version'))
+            row['update'] = latest['version'] if newer else None
+            if newer and core and latest.get('requiredCore') and version_key(latest['requiredCore']) > version_key(core):
+                row['update_requires_core'] = latest['requiredCore']
+        else:
+            row['update'] = 'available' if plugin.get('hasUpdate') else None
+        conflicts = []
+        for dependency in plugin.get('dependencies') or []:
+            name = dependency.get('shortName')
+            have = installed.get(name)
+            if have is None:
+                if not dependency.get('optional'):
+                    conflicts.append(f"{name} {dependency.get('version')} is missing")
+            elif version_key(have) < version_key(dependency.get('version')):
+                conflicts.append(f"needs {name} {dependency.get('version')}, has {have}")
+        row['conflicts'] = conflicts
+        rows.append(row)
+    return rows
@@ -0,0 +1,78 @@
+import random
+import time
+
+import requests
+
+REQUEST_TIMEOUT = (2, 5)
+INITIAL_INTERVAL = 0.5
+MAX_INTERVAL = 5
+READY_TIMEOUT = 120
+
+
+class ProbeError(Exception):
+    pass
+
+
+class ProbeFatalError(ProbeError):
+    """Retrying will not help, e.g. the credentials are rejected."""
+
+
+class ProbeTimeout(ProbeError):
+    pass
+
+
+class NotReady(Exception):
+    pass
+
+
+class ReadinessProbe:
+    """Wait until a Jenkins controller answers, with jittered exponential backoff.
+
+    A check is one anonymous ``GET /login`` (Jenkins sets ``X-Jenkins`` on it once
+    it is up) plus, when ``auth`` is given, one ``GET /api/json?tree=mode`` to make
+    sure the credentials are accepted. Connection errors, timeouts and 5xx are
+    retried until ``timeout``; 401/403 fail at once.
+    """
+
+    def __init__(self, url, auth=None, timeout=READY_TIMEOUT, initial_interval=INITIAL_INTERVAL, max_interval=MAX_INTERVAL):
+        self.url = url.rstrip('/')
+        self.auth = auth
+        self.timeout = timeout
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+
+    def wait(self):
+        """Return the Jenkins version once ready, raise ``ProbeError`` otherwise."""
+        deadline = time.time() + self.timeout
+        interval = self.initial_interval
+        while True:
+            try:
+                return self.check()
+            except NotReady as e:
+                last_error = e
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise ProbeTimeout(f"Jenkins not ready after {self.timeout}s: {last_error}")
+            time.sleep(min(interval * random.uniform(0.5, 1.0), remaining))
+            interval = min(interval * 2, self.max_interval)
+
+    def check(self):
+        response = self._get('/login', auth=None)
+        version = response.headers.get('X-Jenkins')
+        if not version:
+            raise NotReady("no X-Jenkins header yet")
+        if self.auth:
+            self._get('/api/json?tree=mode', auth=self.auth)
+        return version
+
+    def _get(self, path, auth):
+        try:
+            response = requests.get(self.url + path, auth=auth, timeout=REQUEST_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise NotReady(str(e))
+        if response.status_code in (401, 403):
+            raise ProbeFatalError(f"Jenkins rejected the credentials [{response.status_code}]")
+        if response.status_code >= 500:
+            # 503 while Jenkins is starting or restarting
+            raise NotReady(f"HTTP {response.status_code}")
+        return response
@@ -0,0 +1,187 @@
+import threading
+import time
+from array import array
+
+from .client import get_breaker, get_client, get_credentials, jenkins_url
+
+SAMPLE_INTERVAL = 15
+# Samples kept per node: one hour at the default interval
+HISTORY = 240
+# Finished queue waits kept for the percentiles
+WAIT_HISTORY = 1000
+# A sampler nobody looked at for this long stops polling
+IDLE_TIMEOUT = 600
+
+COMPUTER_TREE = (
+    '?tree=computer[displayName,offline,'
+    'executors[idle,currentExecutable[queueId,timestamp]],'
+    'oneOffExecutors[idle,currentExecutable[queueId,timestamp]]]'
+)
+QUEUE_TREE = '?tree=items[id,inQueueSince]'
+
+
+class RingBuffer:
+    """Fixed-size ring of floats backed by a preallocated ``array``."""
+
+    def __init__(self, size, typecode='f'):
+        self._data = array(typecode, bytes(array(typecode).itemsize * size))
+        self._size = size
+        self._next = 0
+        self._count = 0
+
+    def append(self, value):
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def values(self):
+        """Oldest first."""
+        if self._count < self._size:
+            return self._data[:self._count].tolist()
+        return (self._data[self._next:] + self._data[:self._next]).tolist()
+
+    def __len__(self):
+        return self._count
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def sparkline_points(values, width=120, height=24):
+    """SVG polyline points for ``values`` in [0, 1], newest on the right."""
+    if not values:
+        return ''
+    step = width / max(len(values) - 1, 1)
+    return ' '.join(f"{i * step:.1f},{height - min(max(v, 0), 1) * height:.1f}" for i, v in enumerate(values))
+
+
+class ControllerSampler:
+    """Background sampler of executor use and queue waits for one controller.
+
+    Every ``SAMPLE_INTERVAL`` seconds it reads the computer and queue APIs
+    (``tree=``-projected) and appends each node's utilization to its ring.
+    Queue items are followed by id; when one starts building its wait (up to
+    the build's start time) goes into the wait ring used for p50/p95. Views
+    only read this memory.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.credentials = None
+        self.nodes = {}
+        self.waits = RingBuffer(WAIT_HISTORY)
+        self.queue_length = RingBuffer(HISTORY)
+        self.queued = {}
+        self.sampled_at = None
+        self.error = None
+        self.last_viewed = time.time()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def touch(self, credentials):
+        self.credentials = credentials
+        self.last_viewed = time.time()
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True, name=f'jenkins-sampler-{self.url}')
+        self._thread.start()
+
+    def _run(self):
+        while time.time() - self.last_viewed < IDLE_TIMEOUT:
+            time.sleep(SAMPLE_INTERVAL / 3)
+            if self.sampled_at is None or time.time() - self.sampled_at >= SAMPLE_INTERVAL:
+                # Don't poll a controller whose breaker is open
+                if get_breaker(self.url).state == 'closed':
+                    try:
+                        self.sample(get_client(self.url, *self.credentials))
+                        self.error = None
+                    except Exception as e:
+                        self.error = str(e).split('\n')[0]
+
+    def sample(self, server):
+        computers = server.get_info('computer', COMPUTER_TREE).get('computer', [])
+        items = server.get_info('queue', QUEUE_TREE).get('items', [])
+        now = time.time()
+        with self._lock:
+            seen = set()
+            # Queue id -> start time of the builds running right now
+            started = {}
+            for computer in computers:
+                name = computer.get('displayName', '')
+                executors = (computer.get('executors') or []) + (computer.get('oneOffExecutors') or [])
+                busy = sum(1 for e in executors if not e.get('idle', True))
+                for executor in executors:
+                    build = executor.get('currentExecutable') or {}
+                    if 'queueId' in build and build.get('timestamp'):
+                        started[build['queueId']] = build['timestamp'] / 1000
+                node = self.nodes.get(name)
+                if node is None:
+                    node = self.nodes[name] = {'history': RingBuffer(HISTORY)}
+                node.update(offline=bool(computer.get('offline')), busy=busy, executors=len(executors))
+                node['history'].append(busy / len(executors) if executors else 0)
+                seen.add(name)
+            for name in [n for n in self.nodes if n not in seen]:
+                del self.nodes[name]
+
+            queued = {item['id']: item.get('inQueueSince', 0) / 1000 for item in items if 'id' in item}
+            for item_id, since in self.queued.items():
+                # Left the queue since the last sample. Only items found running
+                # count: cancelled items (and builds that already finished) have
+                # no start time to measure the wait against.
+                if item_id not in queued and item_id in started:
+                    self.waits.append(max(0, started[item_id] - since))
+            self.queued = queued
+            self.queue_length.append(len(queued))
+            self.sampled_at = now
+
+    def snapshot(self):
+        with self._lock:
+            nodes = [
+                {
+                    'name': name,
+                    'offline': node['offline'],
+                    'busy': node['busy'],
+                    'executors': node['executors'],
+                    'sparkline': sparkline_points(node['history'].values()),
+                }
+                for name, node in self.nodes.items()
+            ]
+            waits = self.waits.values()
+            current = [time.time() - since for since in self.queued.values()]
+            queue = {
+                'length': len(self.queued),
+                'p50': percentile(waits, 0.5),
+                'p95': percentile(waits, 0.95),
+                'longest': max(current) if current else None,
+                'sparkline': sparkline_points(_scaled(self.queue_length.values())),
+            }
+        return {'nodes': nodes, 'queue': queue, 'sampled_at': self.sampled_at, 'error': self.error}
+
+
+def _scaled(values):
+    top = max(values) if values else 0
+    return [v / top for v in values] if top else values
+
+
+_samplers = {}
+_samplers_lock = threading.Lock()
+
+
+def get_sampler(tool):
+    url = jenkins_url(tool)
+    with _samplers_lock:
+        sampler = _samplers.get(url)
+        if sampler is None:
+            sampler = _samplers[url] = ControllerSampler(url)
+    sampler.touch(get_credentials(tool))
+    return sampler
+
+
+def reset_samplers():
+    with _samplers_lock:
+        _samplers.clear()
@@ -0,0 +1,122 @@
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+from .metrics import record_cache
+
+DEFAULT_TTL = 10
+# How long an expired snapshot may still be served while it is being refreshed
+MAX_STALE = 300
+LOCK_TIMEOUT = 30
+WAIT_INTERVAL = 0.1
+
+
+def get_snapshot(key, fetch, ttl=DEFAULT_TTL, max_stale=MAX_STALE):
+    """Return ``fetch()`` shared through the Django cache.
+
+    Only one caller at a time (across all workers) runs ``fetch`` for a key; the
+    others wait for its result. An expired snapshot is returned immediately and
+    refreshed in the background.
+    """
+    return load_snapshot(key, fetch, ttl, max_stale)['data']
+
+
+def load_snapshot(key, fetch, ttl=DEFAULT_TTL, max_stale=MAX_STALE):
+    """Like ``get_snapshot`` but return the whole ``{'data', 'fetched_at'}`` entry."""
+    entry = cache.get(key)
+    if entry is not None:
+        if time.time() - entry['fetched_at'] >= ttl:
+            record_cache(cache_name(key), 'stale')
+            if _acquire(key):
+                threading.Thread(target=_refresh_in_background, args=(key, fetch, ttl, max_stale), daemon=True).start()
+        else:
+            record_cache(cache_name(key), 'hit')
+        return entry
+    record_cache(cache_name(key), 'miss')
+
+    deadline = time.time() + LOCK_TIMEOUT
+    while True:
+        if _acquire(key):
+            return _refresh(key, fetch, ttl, max_stale)
+        # Someone else is fetching: wait for their snapshot
+        while cache.get(_lock_key(key)) and time.time() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if time.time() >= deadline:
+            return _refresh(key, fetch, ttl, max_stale)
+
+
+def update_snapshot(key, update, ttl=DEFAULT_TTL, max_stale=MAX_STALE):
+    """Replace a cached snapshot's data with ``update(data)``; return the new entry.
+
+    ``None`` means nothing was written: nothing is cached, or the write lock
+    could not be had within ``LOCK_TIMEOUT``.
+
+    ``fetched_at`` is kept so the regular refresh still happens on schedule;
+    ``updated_at`` tells memoizing readers that the data changed.
+    """
+    lock = _write_lock_key(key)
+    token = uuid.uuid4().hex
+    deadline = time.time() + LOCK_TIMEOUT
+    while not cache.add(lock, token, LOCK_TIMEOUT):
+        if time.time() >= deadline:
+            # Another writer still holds the lock: don't overwrite its change
+            return None
+        time.sleep(WAIT_INTERVAL)
+    try:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        entry = dict(entry, data=update(entry['data']), updated_at=time.time())
+        cache.set(key, entry, ttl + max_stale)
+        return entry
+    finally:
+        # Only release our own lock, not one taken after ours expired
+        if cache.get(lock) == token:
+            cache.delete(lock)
+
+
+def cache_name(key):
+    """The key without its controller URL or fingerprint: ``jenkins:plugins:fingerprint:http://...`` -> ``plugins:fingerprint``."""
+    parts = []
+    for part in key.split(':')[1:]:
+        if part in ('http', 'https') or not part.isalpha():
+            break
+        parts.append(part)
+    return ':'.join(parts) or key.split(':')[0]
+
+
+def _refresh(key, fetch, ttl, max_stale):
+    try:
+        entry = {'data': fetch(), 'fetched_at': time.time()}
+        cache.set(key, entry, ttl + max_stale)
+        return entry
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def _refresh_in_background(key, fetch, ttl, max_stale):
+    try:
+        _refresh(key, fetch, ttl, max_stale)
+    except Exception:
+        # Keep serving the previous snapshot; the next reader retries
+        pass
+
+
+def _acquire(key):
+    return cache.add(_lock_key(key), True, LOCK_TIMEOUT)
+
+
+def _lock_key(key):
+    return f"{key}:lock"
+
+
+def _write_lock_key(key):
+    return f"{key}:write"
@@ -1,15 +1,49 @@
-from django.test import TestCase, Client
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from core.models import Tool
 from unittest.mock import patch, MagicMock
+from modules.jenkins.client import invalidate_clients, reset_breakers
+from modules.jenkins.containers import reset_versions, status_cache
+from modules.jenkins.jobs import Job, fetch_jobs, jobs_tree
+from modules.jenkins.sampler import RingBuffer, ControllerSampler, reset_samplers
+from modules.jenkins.metrics import registry
 
 User = get_user_model()
 
 class JenkinsModuleTest(TestCase):
     def setUp(self):
         cache.clear()
+        invalidate_clients()
+        reset_breakers()
+        reset_versions()
+        status_cache.clear()
+        registry.clear()
+        # Don't follow the real docker event stream from tests
+        watch = patch('modules.jenkins.containers.ContainerStatusCache._watch')
+        watch.start()
+        self.addCleanup(watch.stop)
+        reset_samplers()
+        history_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, history_dir)
+        history_db = override_settings(JENKINS_HISTORY_DB=os.path.join(history_dir, 'history.sqlite3'))
+        history_db.enable()
+        self.addCleanup(history_db.disable)
+        history_sync = patch('modules.jenkins.history._start_sync')
+        history_sync.start()
+        self.addCleanup(history_sync.stop)
+        update_center = patch('modules.jenkins.plugins._start_download')
+        update_center.start()
+        self.addCleanup(update_center.stop)
+        sampler = patch('modules.jenkins.sampler.ControllerSampler._run')
+        sampler.start()
+        self.addCleanup(sampler.stop)
         self.client = Client()
         self.user = User.objects.create_superuser(username='admin', password='password', email='admin@test.com')
         self.client.login(username='admin', password='password')
@@ -18,7 +52,7 @@ class JenkinsModuleTest(TestCase):
     @patch('jenkins.Jenkins')
     def test_jenkins_jobs_partial(self, mock_jenkins):
         mock_server = MagicMock()
-        mock_server.get_jobs.return_value = [{'name': 'test-job', 'color': 'blue'}]
+        mock_server.get_info.return_value = {'jobs': [{'name': 'test-job', 'url': 'http://x/job/test-job/', 'color': 'blue'}]}
         mock_jenkins.return_value = mock_server
         
         # Ensure we have the necessary config for Jenkins connection
@@ -42,6 +76,645 @@ class JenkinsModuleTest(TestCase):
         self.tool.refresh_from_db()
         self.assertEqual(self.tool.config_data['username'], 'newadmin')
 
+    @patch('jenkins.Jenkins')
+    def test_jenkins_client_reused_until_creds_change(self, mock_jenkins):
+        from modules.jenkins.module import Module
+        module = Module()
+        mock_jenkins.return_value.get_info.return_value = {'jobs': []}
+        request = MagicMock()
+        request.GET = {'tab': 'jenkins_jobs'}
+
+        module.get_context_data(request, self.tool)
+        module.get_context_data(request, self.tool)
+        self.assertEqual(mock_jenkins.call_count, 1)
+
+        self.client.post(reverse('update_jenkins_creds'), {'username': 'admin', 'password': 'rotated'})
+        self.tool.refresh_from_db()
+        self.tool.config_data.pop('api_token')
+        module.get_context_data(request, self.tool)
+        self.assertEqual(mock_jenkins.call_count, 2)
+        mock_jenkins.assert_called_with('http://localhost:8080', username='admin', password='rotated', timeout=(3, 20))
+
+    @patch('jenkins.Jenkins')
+    def test_jenkins_jobs_snapshot_shared(self, mock_jenkins):
+        from modules.jenkins.module import Module
+        module = Module()
+        mock_jenkins.return_value.get_info.return_value = {'jobs': [{'name': 'test-job', 'url': 'u', 'color': 'blue'}]}
+        request = MagicMock()
+        request.GET = {'tab': 'jenkins_jobs'}
+
+        for _ in range(3):
+            context = module.get_context_data(request, self.tool)
+        self.assertEqual(context['jenkins_jobs'], [Job('test-job', 'u', 'blue', 'jenkins')])
+        mock_jenkins.return_value.get_info.assert_called_once()
+
+    def test_jenkins_fetch_jobs_projects_and_flattens_folders(self):
+        server = MagicMock()
+        server.get_info.return_value = {'jobs': [
+            {'_class': 'hudson.model.FreeStyleProject', 'name': 'build', 'url': 'u1', 'color': 'blue'},
+            {'_class': 'com.cloudbees.hudson.plugins.folder.Folder', 'name': 'team', 'url': 'u2', 'jobs': [
+                {'name': 'deploy', 'url': 'u3', 'color': 'red'},
+            ]},
+        ]}
+
+        jobs = fetch_jobs(server, depth=1)
+        server.get_info.assert_called_once_with(query='?tree=jobs[name,url,color,jobs[name,url,color]]')
+        self.assertEqual(jobs, [Job('build', 'u1', 'blue'), Job('team/deploy', 'u3', 'red')])
+        self.assertFalse(hasattr(jobs[0], '__dict__'))
+        self.assertEqual(jobs_tree(0), 'jobs[name,url,color]')
+
+    @patch('jenkins.Jenkins')
+    def test_jenkins_jobs_pagination_and_filters(self, mock_jenkins):
+        from modules.jenkins.module import Module
+        module = Module()
+        mock_jenkins.return_value.get_info.return_value = {'jobs': [
+            {'name': 'charlie', 'url': 'u', 'color': 'blue'},
+            {'name': 'alpha', 'url': 'u', 'color': 'red'},
+            {'name': 'bravo', 'url': 'u', 'color': 'blue_anime'},
+        ]}
+        request = MagicMock()
+        request.session = {}
+
+        request.GET = {'tab': 'jenkins_jobs', 'page': '2', 'page_size': '1'}
+        context = module.get_context_data(request, self.tool)
+        self.assertEqual([job.name for job in context['jenkins_jobs']], ['bravo'])
+        self.assertEqual(context['jenkins_jobs_page'].paginator.num_pages, 3)
+
+        request.GET = {'tab': 'jenkins_jobs', 'status': 'blue', 'sort': 'name'}
+        context = module.get_context_data(request, self.tool)
+        self.assertEqual([job.name for job in context['jenkins_jobs']], ['bravo', 'charlie'])
+
+        request.GET = {'tab': 'jenkins_jobs', 'q': 'ch'}
+        context = module.get_context_data(request, self.tool)
+        self.assertEqual([job.name for job in context['jenkins_jobs']], ['charlie'])
+
+        # Auto-refresh without params keeps the last view
+        request.GET = {'tab': 'jenkins_jobs'}
+        context = module.get_context_data(request, self.tool)
+        self.assertEqual(context['jenkins_jobs_view']['q'], 'ch')
+        self.assertEqual(context['jenkins_job_statuses'], [('red', 1), ('blue', 2)])
+
+        mock_jenkins.return_value.get_info.assert_called_once()
+
+    @patch('jenkins.Jenkins')
+    def test_jenkins_jobs_delta_refresh(self, mock_jenkins):
+        mock_jenkins.return_value.get_info.return_value = {'jobs': [
+            {'name': 'build', 'url': 'u1', 'color': 'blue'},
+            {'name': 'deploy', 'url': 'u2', 'color': 'blue'},
+        ]}
+        url = reverse('tool_detail', kwargs={'tool_name': 'jenkins'})
+        params = {'tab': 'jenkins_jobs', 'page': '1', 'page_size': '50', 'sort': 'name', 'q': '', 'status': ''}
+
+        response = self.client.get(url, params, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag'].strip('"')
+        # No webhook token: nothing is pushed, so no event stream is opened
+        self.assertNotContains(response, 'EventSource')
+        self.assertEqual(self.client.get(reverse('jenkins_job_events')).status_code, 204)
+
+        response = self.client.get(url, dict(params, since=etag), HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(url, params, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=f'"{etag}"')
+        self.assertEqual(response.status_code, 304)
+
+        mock_jenkins.return_value.get_info.return_value['jobs'][1]['color'] = 'red'
+        cache.delete('jenkins:jobs:http://localhost:8080')
+        response = self.client.get(url, dict(params, since=etag), HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['HX-Reswap'], 'none')
+        self.assertContains(response, Job('deploy', 'u2', 'red', 'jenkins').dom_id + '-status')
+        self.assertNotContains(response, Job('build', 'u1', 'blue', 'jenkins').dom_id)
+
+    @patch('jenkins.Jenkins')
+    def test_jenkins_webhook_updates_snapshot_and_pushes_event(self, mock_jenkins):
+        from modules.jenkins import events
+        mock_jenkins.return_value.get_info.return_value = {'jobs': [
+            {'name': 'team', 'jobs': [{'name': 'build', 'url': 'u', 'color': 'blue'}]},
+        ]}
+        self.tool.config_data['webhook_token'] = 'secret'
+        self.tool.save()
+        url = reverse('jenkins_job_webhook')
+        payload = {'name': 'build', 'url': 'job/team/job/build/', 'build': {'number': 2, 'phase': 'STARTED'}}
+
+        response = self.client.post(url, json.dumps(payload), content_type='application/json', HTTP_X_JENKINS_TOKEN='wrong')
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(reverse('tool_detail', kwargs={'tool_name': 'jenkins'}) + "?tab=jenkins_jobs", HTTP_HX_REQUEST='true')
+        self.assertContains(response, 'every 120s')
+        self.assertContains(response, 'EventSource')
+
+        response = self.client.post(url + '?token=secret', json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(cache.get('jenkins:jobs:http://localhost:8080')['data'][0].color, 'blue_anime')
+
+        payload['build'].update(phase='COMPLETED', status='FAILURE')
+        self.client.post(url + '?token=secret', json.dumps(payload), content_type='application/json')
+        self.assertEqual(cache.get('jenkins:jobs:http://localhost:8080')['data'][0].color, 'red')
+
+        stream = events.stream(since=0)
+        next(stream)
+        self.assertIn('blue_anime', next(stream))
+        event = next(stream)
+        self.assertIn('event: job', event)
+        self.assertIn(Job('team/build', 'u', 'red', 'jenkins').dom_id + '-status', event)
+        stream.close()
+        mock_jenkins.return_value.get_info.assert_called_once()
+
+    def test_jenkins_console_streams_progressively_from_offset(self):
+        from modules.jenkins.console import stream_console
+        server = MagicMock()
+        server.server = 'http://localhost:8080/'
+        first = MagicMock(status_code=200, headers={'X-More-Data': 'true', 'X-Text-Size': '21'})
+        # "é" split across two chunks
+        first.iter_content.return_value = [b'line 1\nline \xc3', b'\xa92\n']
+        second = MagicMock(status_code=200, headers={'X-Text-Size': '26'})
+        second.iter_content.return_value = [b'done\n']
+        server._session.get.side_effect = [first, second]
+
+        with patch('modules.jenkins.console.time.sleep'):
+            events = list(stream_console(server, 'team/build', 7, start=5, auth=('admin', 'token')))
+        self.assertEqual(server._session.get.call_args_list[0][1]['auth'], ('admin', 'token'))
+        self.assertEqual(server._session.get.call_args_list[0][0][0], 'http://localhost:8080/job/team/job/build/7/logText/progressiveText')
+        self.assertEqual([c[1]['params'] for c in server._session.get.call_args_list], [{'start': 5}, {'start': 21}])
+        log = [e for e in events if 'event: log' in e]
+        self.assertTrue(log[0].startswith('id: 17\n'))
+        self.assertEqual(json.loads(log[1].split('data: ')[1])['text'], '\xe92\n')
+        self.assertIn('event: done', events[-1])
+
+        # An open breaker answers with one failed event, without calling Jenkins
+        from modules.jenkins.client import get_breaker
+        breaker = get_breaker('http://localhost:8080')
+        breaker.record_failure("Connection refused", trip=True)
+        with patch('modules.jenkins.views.stream_console') as mock_stream:
+            response = self.client.get(reverse('jenkins_build_console_stream'), {'job': 'team/build', 'build': '7'})
+        self.assertContains(response, 'event: failed')
+        self.assertContains(response, 'Connection refused')
+        mock_stream.assert_not_called()
+
+    @patch('jenkins.Jenkins')
+    def test_jenkins_bulk_actions_report_per_job_results(self, mock_jenkins):
+        from modules.jenkins.actions import TokenBucket, progress_key, _run_bulk
+        server = mock_jenkins.return_value
+        def disable_job(name):
+            if name == 'broken':
+                raise Exception("403 Forbidden")
+        server.disable_job.side_effect = disable_job
+
+        with patch('modules.jenkins.views.start_bulk', return_value='run1') as mock_start:
+            cache.set(progress_key('run1'), {'action': 'disable', 'total': 3, 'results': [], 'done': False})
+            response = self.client.post(reverse('jenkins_bulk_action'), {
+                'action': 'disable', 'jobs': ['build|jenkins', 'team/deploy|jenkins', 'broken|jenkins', 'x|unknown'],
+            })
+        self.assertContains(response, 'every 1s')
+        action, targets = mock_start.call_args[0]
+        self.assertEqual([job for _, _, job in targets], ['build', 'team/deploy', 'broken'])
+
+        _run_bulk('run1', action, targets, concurrency=2, rate=1000)
+        progress = cache.get(progress_key('run1'))
+        self.assertTrue(progress['done'])
+        self.assertEqual(sorted((r['job'], r['ok']) for r in progress['results']), [('broken', False), ('build', True), ('team/deploy', True)])
+        self.assertEqual(server.disable_job.call_count, 3)
+        response = self.client.get(reverse('jenkins_bulk_progress', args=['run1']))
+        self.assertContains(response, '403 Forbidden')
+        self.assertNotContains(response, 'every 1s')
+
+        # Bursts up to the bucket size, then one token per 1/rate seconds
+        clock = [0.0]
+        with patch('modules.jenkins.actions.time') as mock_time:
+            mock_time.monotonic.side_effect = lambda: clock[0]
+            mock_time.sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+            bucket = TokenBucket(rate=2, burst=2)
+            for _ in range(4):
+                bucket.acquire()
+        self.assertEqual(clock[0], 1.0)
+
+        # One bucket per controller, whatever each batch asks for
+        from modules.jenkins.actions import get_bucket, start_bulk
+        bucket = get_bucket('http://shared:8080', 5, 4)
+        self.assertIs(get_bucket('http://shared:8080', 1, 2), bucket)
+        self.assertEqual((bucket.rate, bucket.burst), (1, 2))
+
+        # Zero settings are clamped instead of stalling the run
+        with patch('modules.jenkins.actions.threading.Thread') as mock_thread:
+            start_bulk('build', targets, concurrency=0, rate=0)
+        _, _, _, concurrency, rate = mock_thread.call_args[1]['args']
+        self.assertEqual((concurrency, rate), (1, 5))
+
+    @patch('jenkins.Jenkins')
+    def test_jenkins_overview_fetches_sections_concurrently(self, mock_jenkins):
+        from modules.jenkins.module import Module
+        module = Module()
+
+        def get_info(item='', query=None):
+            return {
+                '': {'jobs': [{'name': 'build', 'url': 'u', 'color': 'red'}]},
+                'computer': {'busyExecutors': 1, 'totalExecutors': 2, 'computer': [{'displayName': 'built-in', 'offline': False}]},
+                'pluginManager': {'plugins': [{'enabled': True, 'hasUpdate': True}, {'enabled': False, 'hasUpdate': False}]},
+                'queue': {'items': [{'why': 'Waiting for executor', 'task': {'name': 'build'}}]},
+            }[item]
+        mock_jenkins.return_value.get_info.side_effect = get_info
+
+        request = MagicMock()
+        request.GET = {'tab': 'jenkins_overview'}
+        context = module.get_context_data(request, self.tool)
+        overview = context['jenkins_overview']
+        self.assertEqual(overview['jobs'], [('red', 1)])
+        self.assertEqual(overview['nodes']['busy_executors'], 1)
+        self.assertEqual(overview['plugins'], {'total': 2, 'enabled': 1, 'updates': 1})
+        self.assertEqual(len(overview['queue']), 1)
+        self.assertEqual(context['jenkins_overview_pending'], [])
+
+        request.GET = {'tab': 'jenkins_overview', 'section': 'queue'}
+        context = module.get_context_data(request, self.tool)
+        self.assertEqual(list(context['jenkins_overview']), ['queue'])
+        response = module.handle_hx_request(request, self.tool, 'jenkins_overview')
+        self.assertContains(response, 'Waiting for executor')
+
+    @patch('modules.jenkins.module.OVERVIEW_TIMEOUT', 0.05)
+    @patch('jenkins.Jenkins')
+    def test_jenkins_overview_placeholder_waits_on_running_fetch(self, mock_jenkins):
+        import threading
+        from modules.jenkins.module import Module
+        module = Module()
+        release = threading.Event()
+
+        def get_info(item='', query=None):
+            release.wait(5)
+            return {'items': [{'why': 'Waiting for executor', 'task': {'name': 'build'}}]}
+        mock_jenkins.return_value.get_info.side_effect = get_info
+
+        request = MagicMock()
+        request.GET = {'tab': 'jenkins_overview', 'section': 'queue'}
+        for _ in range(3):
+            context = module.get_context_data(request, self.tool)
+            self.assertEqual(context['jenkins_overview_pending'], ['queue'])
+        release.set()
+        context = module.get_context_data(request, self.tool)
+        self.assertEqual(len(context['jenkins_overview']['queue']), 1)
+        # Every poll waited on the same request to Jenkins
+        mock_jenkins.return_value.get_info.assert_called_once()
+
+    @patch('jenkins.Jenkins')
+    def test_jenkins_instances_fan_out_and_merge(self, mock_jenkins):
+        from modules.jenkins.module import Module
+        module = Module()
+        self.tool.config_data['instances'] = [
+            {'name': 'ci-eu', 'url': 'http://eu:8080', 'api_token': 't'},
+            {'name': 'ci-us', 'url': 'http://us:8080', 'api_token': 't'},
+        ]
+        self.tool.save()
+
+        def make_server(url, **kwargs):
+            server = MagicMock()
+            if url == 'http://us:8080':
+                server.get_info.side_effect = Exception("500 Server Error")
+            else:
+                server.get_info.return_value = {'jobs': [{'name': 'build', 'url': url, 'color': 'blue'}]}
+            return server
+        mock_jenkins.side_effect = make_server
+
+        request = MagicMock()
+        request.session = {}
+        request.GET = {'tab': 'jenkins_jobs', 'sort': 'instance'}
+        context = module.get_context_data(request, self.tool)
+        self.assertEqual([(job.instance, job.name) for job in context['jenkins_jobs']], [('ci-eu', 'build'), ('jenkins', 'build')])
+        self.assertEqual([(e['instance'], e['jenkins_error']) for e in context['jenkins_instance_errors']], [('ci-us', '500 Server Error')])
+        self.assertTrue(context['jenkins_connected'])
+
+        response = module.render_jobs(request, dict(context, tool=self.tool))
+        self.assertContains(response, 'ci-us:')
+
+    @patch('modules.jenkins.module.Module.get_service_status', return_value='stopped')
+    def test_jenkins_remote_controller_breaker_ignores_local_docker(self, mock_status):
+        import requests
+        from modules.jenkins.module import Module
+        from modules.jenkins.instances import Instance
+        from modules.jenkins.client import get_breaker
+        instance = Instance('ci-eu', {'url': 'http://eu:8080', 'api_token': 't'})
+        Module().record_unreachable(instance, requests.exceptions.ConnectionError("Connection refused"))
+        self.assertEqual(get_breaker('http://eu:8080').state, 'closed')
+        mock_status.assert_not_called()
+
+    @patch('modules.jenkins.module.Module.get_service_status', return_value='stopped')
+    @patch('jenkins.Jenkins')
+    def test_jenkins_circuit_breaker_fails_fast(self, mock_jenkins, mock_status):
+        import requests
+        from modules.jenkins.module import Module
+        module = Module()
+        mock_jenkins.return_value.get_info.side_effect = requests.exceptions.ConnectionError("Connection refused")
+        request = MagicMock()
+        request.GET = {'tab': 'jenkins_nodes'}
+
+        context = module.get_context_data(request, self.tool)
+        self.assertIn('Connection refused', context['jenkins_error'])
+
+        context = module.get_context_data(request, self.tool)
+        self.assertTrue(context['jenkins_unreachable'])
+        self.assertEqual(context['jenkins_unreachable_reason'], "Jenkins container is not running")
+        mock_jenkins.return_value.get_info.assert_called_once()
+
+        # Once the backoff elapsed a successful probe closes the breaker again
+        from modules.jenkins.client import get_breaker
+        breaker = get_breaker('http://localhost:8080')
+        breaker.retry_at = 0
+        mock_jenkins.return_value.get_info.side_effect = None
+        mock_jenkins.return_value.get_info.return_value = {}
+        with patch.object(breaker, 'probe', return_value=True):
+            context = module.get_context_data(request, self.tool)
+        self.assertTrue(context['jenkins_connected'])
+        self.assertEqual(breaker.state, 'closed')
+
+    @patch('modules.jenkins.sampler.time.time')
+    def test_jenkins_sampler_ring_buffer_and_queue_waits(self, mock_time):
+        ring = RingBuffer(3)
+        for value in (1, 2, 3, 4):
+            ring.append(value)
+        self.assertEqual(ring.values(), [2, 3, 4])
+
+        server = MagicMock()
+        samples = [
+            [{'id': 1, 'inQueueSince': 0}, {'id': 2, 'inQueueSince': 5000}, {'id': 3, 'inQueueSince': 6000}],
+            [{'id': 2, 'inQueueSince': 5000}, {'id': 3, 'inQueueSince': 6000}],
+            [],
+        ]
+        running = [
+            [],
+            [{'queueId': 1, 'timestamp': 12000}],
+            [{'queueId': 1, 'timestamp': 12000}, {'queueId': 3, 'timestamp': 26000}],
+        ]
+        def get_info(item, query):
+            if item == 'computer':
+                builds = running.pop(0)
+                executors = [{'idle': False, 'currentExecutable': build} for build in builds]
+                executors += [{'idle': False, 'currentExecutable': None}] * (2 - len(executors))
+                return {'computer': [{'displayName': 'agent', 'executors': executors}]}
+            return {'items': samples.pop(0)}
+        server.get_info.side_effect = get_info
+
+        sampler = ControllerSampler('http://localhost:8080')
+        for now in (10, 20, 30):
+            mock_time.return_value = now
+            sampler.sample(server)
+        snapshot = sampler.snapshot()
+        # Item 1 started at t=12 after 12s and item 3 at t=26 after 20s, whenever
+        # the sampler noticed; item 2 was cancelled and never started
+        self.assertEqual(sorted(sampler.waits.values()), [12, 20])
+        self.assertEqual(snapshot['queue']['p50'], 20)
+        self.assertEqual(snapshot['queue']['length'], 0)
+        self.assertEqual(snapshot['nodes'][0]['busy'], 2)
+        self.assertEqual(len(sampler.nodes['agent']['history']), 3)
+
+    @patch('modules.jenkins.history.time.time', return_value=1000)
+    def test_jenkins_build_history_sync_is_incremental(self, mock_time):
+        from modules.jenkins.history import sync, job_stats
+        server = MagicMock()
+        state = {'last': 3, 'builds': [
+            {'number': 3, 'result': 'SUCCESS', 'duration': 10000, 'timestamp': 900000},
+            {'number': 2, 'result': 'FAILURE', 'duration': 30000, 'timestamp': 800000},
+            {'number': 1, 'result': 'SUCCESS', 'duration': 20000, 'timestamp': 700000},
+        ]}
+        def get_info(item='', query=None):
+            if item == '':
+                return {'jobs': [{'name': 'team', 'jobs': [{'name': 'build', 'lastCompletedBuild': {'number': state['last']}}]}]}
+            self.assertEqual(item, 'job/team/job/build')
+            return {'builds': state['builds']}
+        server.get_info.side_effect = get_info
+
+        self.assertEqual(sync(server, 'http://localhost:8080'), 3)
+        # Nothing new: only the job list is read
+        server.get_info.reset_mock()
+        self.assertEqual(sync(server, 'http://localhost:8080'), 0)
+        server.get_info.assert_called_once()
+
+        state['last'] = 4
+        state['builds'] = [
+            {'number': 5, 'result': None, 'duration': 0, 'timestamp': 990000},
+            {'number': 4, 'result': 'SUCCESS', 'duration': 40000, 'timestamp': 950000},
+        ] + state['builds']
+        self.assertEqual(sync(server, 'http://localhost:8080'), 1)
+
+        stats = job_stats('http://localhost:8080', ['team/build'])['team/build']
+        self.assertEqual(stats['builds'], 4)
+        self.assertEqual(stats['p50'], 30)
+        self.assertEqual(stats['failure_rate'], 0.25)
+
+    @patch('modules.jenkins.module.DockerCLI')
+    def test_jenkins_service_version_memoized(self, mock_docker):
+        from modules.jenkins.module import Module
+        module = Module()
+        mock_container = MagicMock()
+        mock_container.status = 'running'
+        mock_container.id = 'jenk123'
+        mock_container.attrs = {'Image': 'sha256:abc', 'Config': {'Env': ['PATH=/usr/bin', 'JENKINS_VERSION=2.452.3']}}
+        mock_docker.return_value.containers.get.return_value = mock_container
+
+        self.assertEqual(module.get_service_version(), "2.452.3")
+        mock_container.exec_run.assert_not_called()
+
+        # Without version metadata the JVM runs only once per container
+        mock_container.id = 'jenk456'
+        mock_container.attrs = {'Image': 'sha256:def'}
+        mock_container.exec_run.return_value = MagicMock(exit_code=0, output=b"2.440.1\n")
+        for _ in range(3):
+            self.assertEqual(module.get_service_version(), "2.440.1")
+        mock_container.exec_run.assert_called_once()
+
+    @patch('modules.jenkins.module.subprocess.check_output')
+    def test_jenkins_module_version_memoized(self, mock_check_output):
+        from modules.jenkins import module as jenkins_module
+        jenkins_module._module_version = None
+        versions = {jenkins_module.Module().version for _ in range(5)}
+        self.assertEqual(len(versions), 1)
+        # The shipped VERSION file means git is never run
+        mock_check_output.assert_not_called()
+
+    @patch('modules.jenkins.module.DockerCLI')
+    def test_jenkins_status_served_from_event_cache(self, mock_docker):
+        from modules.jenkins.module import Module
+        module = Module()
+        mock_container = MagicMock()
+        mock_container.status = 'running'
+        mock_docker.return_value.containers.get.return_value = mock_container
+
+        for _ in range(3):
+            self.assertEqual(module.get_service_status(self.tool), 'running')
+        mock_docker.return_value.containers.get.assert_called_once()
+
+        status_cache._on_event('jenkins', module._inspect_container, b'{"Type": "container", "Action": "die"}')
+        self.assertEqual(module.get_service_status(self.tool), 'stopped')
+        status_cache._on_event('jenkins', module._inspect_container, b'{"Type": "container", "Action": "start"}')
+        self.assertEqual(module.get_service_status(self.tool), 'running')
+        self.assertEqual(mock_docker.return_value.containers.get.call_count, 2)
+
+        # A watcher for a container nobody asks about any more stops
+        from modules.jenkins.containers import IDLE_TIMEOUT
+        status_cache._watchers['jenkins'] = MagicMock()
+        with patch('modules.jenkins.containers.time.time', return_value=status_cache._last_read['jenkins'] + IDLE_TIMEOUT), \
+                patch('modules.jenkins.containers.subprocess.Popen') as mock_popen:
+            status_cache._follow('jenkins', module._inspect_container)
+        mock_popen.assert_not_called()
+        self.assertNotIn('jenkins', status_cache._watchers)
+        self.assertNotIn('jenkins', status_cache._entries)
+
+    def test_jenkins_initial_password_scan_is_incremental(self):
+        from modules.jenkins.installer import scan_for_password, wait_for_initial_password, PASSWORD_MARKER
+        log = ("INFO startup\n" * 2000 + PASSWORD_MARKER + "\n\n" + "a1" * 16 + "\nmore\n").encode()
+        chunks = [log[i:i + 13] for i in range(0, len(log), 13)]
+        self.assertEqual(scan_for_password(iter(chunks)), "a1" * 16)
+        self.assertIsNone(scan_for_password(iter([b"no password here\n"] * 100)))
+
+        container = MagicMock()
+        container.logs.return_value = iter(chunks)
+        self.assertEqual(wait_for_initial_password(container, timeout=5), "a1" * 16)
+        container.logs.assert_called_once_with(stream=True, follow=True)
+
+    @patch('modules.jenkins.installer.time.sleep')
+    def test_jenkins_initial_password_polled_when_logs_not_streamed(self, mock_sleep):
+        from modules.jenkins.installer import wait_for_initial_password, PASSWORD_MARKER
+        # A log client that ignores stream=/follow= and returns the log so far
+        logs = [b"INFO startup\n", b"INFO startup\n", ("INFO startup\n" + PASSWORD_MARKER + "\n" + "b2" * 16 + "\n").encode()]
+        container = MagicMock()
+        container.logs.side_effect = lambda **kwargs: logs.pop(0) if len(logs) > 1 else logs[0]
+        self.assertEqual(wait_for_initial_password(container, timeout=5), "b2" * 16)
+        self.assertGreaterEqual(container.logs.call_count, 3)
+
+    @patch('modules.jenkins.readiness.time.sleep')
+    @patch('modules.jenkins.readiness.requests.get')
+    def test_jenkins_readiness_probe(self, mock_get, mock_sleep):
+        import requests
+        from modules.jenkins.readiness import ReadinessProbe, ProbeFatalError, ProbeTimeout
+        ready = MagicMock(status_code=200, headers={'X-Jenkins': '2.452.3'})
+        mock_get.side_effect = [
+            requests.ConnectionError("refused"),
+            MagicMock(status_code=503, headers={}),
+            ready,
+            ready,
+        ]
+        self.assertEqual(ReadinessProbe('http://localhost:8080', auth=('admin', 'pw')).wait(), '2.452.3')
+        self.assertEqual(mock_sleep.call_count, 2)
+        # Backoff starts short and grows
+        self.assertLessEqual(mock_sleep.call_args_list[0][0][0], 0.5)
+
+        # Rejected credentials are not retried
+        mock_sleep.reset_mock()
+        mock_get.side_effect = [ready, MagicMock(status_code=401, headers={})]
+        with self.assertRaises(ProbeFatalError):
+            ReadinessProbe('http://localhost:8080', auth=('admin', 'wrong')).wait()
+        mock_sleep.assert_not_called()
+
+        mock_get.side_effect = requests.ConnectionError("refused")
+        with self.assertRaises(ProbeTimeout):
+            ReadinessProbe('http://localhost:8080', timeout=0).wait()
+
+    @patch('modules.jenkins.installer.threading.Thread')
+    def test_jenkins_install_image_stage(self, mock_thread):
+        from modules.jenkins.installer import ensure_image, prepare_host
+        client = MagicMock()
+        client.images.get.return_value.attrs = {'RepoDigests': ['jenkins/jenkins@sha256:abc']}
+        client.images.get_registry_data.return_value.id = 'sha256:abc'
+        report = MagicMock()
+
+        ensure_image(client, report)
+        client.api.pull.assert_not_called()
+        client.images.pull.assert_not_called()
+        mock_thread.assert_not_called()
+
+        # Missing image: pulled in the foreground with per-layer progress
+        client.images.get.side_effect = Exception("No such image")
+        client.api.pull.return_value = [
+            {'id': 'l1', 'status': 'Downloading', 'progressDetail': {'current': 5000000, 'total': 10000000}},
+            {'id': 'l2', 'status': 'Downloading', 'progressDetail': {'current': 0, 'total': 20000000}},
+        ]
+        ensure_image(client, report)
+        client.api.pull.assert_called_once_with('jenkins/jenkins', tag='lts', stream=True, decode=True)
+        self.assertIn('5.0/10.0 MB (0/1 layers)', report.call_args_list[-1][0][0])
+
+        client.networks.get.return_value = None
+        prepare_host(client, ['jenkins_vol'], report)
+        client.volumes.create.assert_called_once_with(name='jenkins_vol')
+        client.networks.create.assert_called_once_with('jenkins_network', driver='bridge')
+        for operation in ('docker.volumes.create', 'docker.networks.create', 'docker.images.pull'):
+            self.assertIn(operation, registry.latency)
+
+    def test_jenkins_install_progress_coalesced(self):
+        from modules.jenkins.installer import InstallProgress
+        self.tool.status = 'installing'
+        progress = InstallProgress(self.tool)
+        with patch.object(self.tool, 'save', wraps=self.tool.save) as mock_save:
+            for i in range(10):
+                progress.stage(f"Pulling layer {i}")
+            mock_save.assert_called_once_with(update_fields=['current_stage'])
+
+            response = self.client.get(reverse('jenkins_install_progress'))
+            self.assertContains(response, "Pulling layer 9")
+            self.assertNotIn('HX-Refresh', response)
+
+            # The installing page shows the same polling partial
+            from django.template.loader import render_to_string
+            html = render_to_string('core/modules/jenkins_install.html', {'tool': self.tool})
+            self.assertIn('jenkins-install-progress', html)
+            self.assertIn(reverse('jenkins_install_progress'), html)
+
+            self.tool.status = 'installed'
+            progress.finish()
+            mock_save.assert_called_with(update_fields=['status', 'current_stage', 'config_data', 'version'])
+        self.tool.refresh_from_db()
+        self.assertEqual(self.tool.current_stage, "Pulling layer 9")
+        response = self.client.get(reverse('jenkins_install_progress'))
+        self.assertEqual(response['HX-Refresh'], 'true')
+
+    def test_jenkins_provision_plugins(self):
+        from modules.jenkins.installer import provision_plugins
+        container = MagicMock()
+        counts = iter([b"0\n", b"40\n"])
+
+        def exec_run(cmd, **kwargs):
+            if 'wc -l' in cmd:
+                return MagicMock(exit_code=0, output=next(counts))
+            return MagicMock(exit_code=0, output=b"")
+        container.exec_run.side_effect = exec_run
+
+        self.assertEqual(provision_plugins(container, MagicMock()), (True, True))
+        commands = [c[0][0] for c in container.exec_run.call_args_list]
+        self.assertTrue(any(c.startswith('jenkins-plugin-cli') and 'workflow-aggregator' in c for c in commands))
+        # Downloads are written back to the cache as root
+        container.exec_run.assert_any_call("sh -c 'cp -u /var/jenkins_home/plugins/*.jpi /var/jenkins_plugin_cache/ 2>/dev/null; true'", user='root')
+
+        # Offline with nothing cached is an error
+        counts = iter([b"0\n", b"0\n"])
+        container.exec_run.side_effect = lambda cmd, **kwargs: MagicMock(
+            exit_code=1 if cmd.startswith('jenkins-plugin-cli') else 0,
+            output=next(counts) if 'wc -l' in cmd else b"")
+        with self.assertRaises(RuntimeError):
+            provision_plugins(container, MagicMock())
+
+    @patch('modules.jenkins.snapshots.threading.Thread')
+    def test_jenkins_stale_snapshot_served_while_refreshing(self, mock_thread):
+        from modules.jenkins.snapshots import get_snapshot
+        cache.set('jenkins:jobs:test', {'data': ['old'], 'fetched_at': 0})
+        fetch = MagicMock(return_value=['new'])
+
+        self.assertEqual(get_snapshot('jenkins:jobs:test', fetch), ['old'])
+        mock_thread.assert_called_once()
+        fetch.assert_not_called()
+        # A second reader does not start another refresh while one is in flight
+        get_snapshot('jenkins:jobs:test', fetch)
+        mock_thread.assert_called_once()
+
+    @patch('modules.jenkins.snapshots.LOCK_TIMEOUT', 0)
+    def test_jenkins_snapshot_update_never_writes_without_the_lock(self):
+        from modules.jenkins.snapshots import update_snapshot
+        cache.set('jenkins:jobs:test', {'data': ['old'], 'fetched_at': 0})
+        cache.set('jenkins:jobs:test:write', 'other-writer')
+        self.assertIsNone(update_snapshot('jenkins:jobs:test', lambda data: ['new']))
+        self.assertEqual(cache.get('jenkins:jobs:test')['data'], ['old'])
+        # The other writer's lock is left alone
+        self.assertEqual(cache.get('jenkins:jobs:test:write'), 'other-writer')
+
+        cache.delete('jenkins:jobs:test:write')
+        self.assertEqual(update_snapshot('jenkins:jobs:test', lambda data: ['new'])['data'], ['new'])
+        self.assertIsNone(cache.get('jenkins:jobs:test:write'))
+
     @patch('jenkins.Jenkins')
     def test_jenkins_change_password(self, mock_jenkins):
         mock_server = MagicMock()
@@ -54,30 +727,42 @@ class JenkinsModuleTest(TestCase):
         self.assertEqual(response.status_code, 302)
         mock_server.run_script.assert_called_once()
 
-    @patch('modules.jenkins.views.DockerCLI')
-    def test_find_jenkins(self, mock_docker):
-        mock_client = MagicMock()
-        
-        # Use a real object or a very specific mock for the container
-        class MockContainer:
-            def __init__(self):
-                self.name = "jenkins-test"
-                self.status = "running"
-                self.id = "jenk123"
-                self.image = MagicMock()
-                self.image.tags = ["jenkins/jenkins:lts"]
-                self.attrs = {'HostConfig': {'PortBindings': {'8080/tcp': [{'HostPort': '8081'}]}}}
-        
-        mock_container = MockContainer()
-        mock_client.containers.list.return_value = [mock_container]
-        mock_docker.return_value = mock_client
-        
+    @patch('modules.jenkins.containers.subprocess.run')
+    def test_find_jenkins(self, mock_run):
+        listing = (
+            "aaa\tjenkins-test\tjenkins/jenkins:lts\n"
+            "bbb\tci-old\tjenkins/jenkins:2.401\n"
+            "ccc\tjenkins-agent\tjenkins/inbound-agent\n"
+            "ddd\tpostgres\tpostgres:16\n"
+        )
+        inspect = [
+            {'Id': 'bbb', 'Name': '/ci-old', 'State': {'Status': 'exited'},
+             'Config': {'Image': 'jenkins/jenkins:2.401', 'Env': ['JENKINS_VERSION=2.401'], 'ExposedPorts': {'8080/tcp': {}}},
+             'HostConfig': {'PortBindings': {'8080/tcp': [{'HostPort': '8090'}]}}},
+            {'Id': 'aaa', 'Name': '/jenkins-test', 'State': {'Status': 'running'},
+             'Config': {'Image': 'jenkins/jenkins:lts', 'Env': ['JENKINS_VERSION=2.440.1'], 'ExposedPorts': {'8080/tcp': {}, '50000/tcp': {}}},
+             'NetworkSettings': {'Ports': {'8080/tcp': [{'HostPort': '8081'}], '50000/tcp': [{'HostPort': '50001'}]}},
+             'Mounts': [{'Name': 'jenkins_vol', 'Destination': '/var/jenkins_home'}]},
+            {'Id': 'ccc', 'Name': '/jenkins-agent', 'State': {'Status': 'running'},
+             'Config': {'Image': 'jenkins/inbound-agent', 'Env': []}},
+        ]
+        mock_run.side_effect = [
+            MagicMock(stdout=listing.encode()),
+            MagicMock(stdout=json.dumps(inspect).encode()),
+        ]
+
         url = reverse('find_jenkins')
         response = self.client.get(url)
         self.assertEqual(response.status_code, 302)
+        # One listing plus one batched inspect of the candidates only
+        self.assertEqual(mock_run.call_count, 2)
+        self.assertEqual(mock_run.call_args_list[1][0][0], ['docker', 'inspect', 'aaa', 'bbb', 'ccc'])
         self.tool.refresh_from_db()
         self.assertEqual(self.tool.status, 'installed')
         self.assertEqual(self.tool.config_data['port'], '8081')
+        self.assertEqual(self.tool.config_data['jnlp_port'], '50001')
+        self.assertEqual(self.tool.config_data['volume_name'], 'jenkins_vol')
+        self.assertEqual([c['name'] for c in self.tool.config_data['controllers']], ['jenkins-test', 'ci-old'])
 
     @patch('modules.jenkins.module.DockerCLI')
     def test_jenkins_module_logic(self, mock_docker):
@@ -111,7 +796,7 @@ class JenkinsModuleTest(TestCase):
         
         # Test context data with jobs
         mock_server = MagicMock()
-        mock_server.get_jobs.return_value = []
+        mock_server.get_info.return_value = {'jobs': []}
         with patch('jenkins.Jenkins', return_value=mock_server):
             self.tool.config_data['password'] = 'test'
             context = module.get_context_data(MagicMock(), self.tool)
@@ -122,12 +807,12 @@ class JenkinsModuleTest(TestCase):
         module = Module()
         request = MagicMock()
         with patch.object(Module, 'get_context_data', return_value={'tool': self.tool}):
-            for target in ['jenkins_jobs', 'jenkins_nodes', 'jenkins_plugins']:
+            for target in ['jenkins_jobs', 'jenkins_nodes', 'jenkins_plugins', 'jenkins_overview']:
                 response = module.handle_hx_request(request, self.tool, target)
                 self.assertIsNotNone(response)
 
-    @patch('modules.jenkins.module.threading.Thread')
-    def test_jenkins_install(self, mock_thread):
+    @patch('modules.jenkins.module.install_scheduler.submit')
+    def test_jenkins_install(self, mock_submit):
         from modules.jenkins.module import Module
         module = Module()
         self.tool.status = 'not_installed'
@@ -141,7 +826,8 @@ class JenkinsModuleTest(TestCase):
         module.install(request, self.tool)
         self.tool.refresh_from_db()
         self.assertEqual(self.tool.status, 'installing')
-        mock_thread.assert_called_once()
+        mock_submit.assert_called_once()
+        self.assertEqual(self.tool.config_data['install']['completed'], [])
 
     @patch('core.docker_cli_wrapper.run_command')
     def test_jenkins_status_detection(self, mock_run):
@@ -153,10 +839,11 @@ class JenkinsModuleTest(TestCase):
         status = module.get_service_status(self.tool)
         self.assertEqual(status, "running")
 
+    @patch('modules.jenkins.module.ReadinessProbe')
     @patch('modules.jenkins.module.DockerCLI')
     @patch('jenkins.Jenkins')
-    @patch('modules.jenkins.module.threading.Thread')
-    def test_jenkins_install_full_process(self, mock_thread, mock_jenkins, mock_docker):
+    @patch('modules.jenkins.module.install_scheduler.submit')
+    def test_jenkins_install_full_process(self, mock_submit, mock_jenkins, mock_docker, mock_probe):
         from modules.jenkins.module import Module
         module = Module()
         self.tool.status = 'not_installed'
@@ -173,7 +860,7 @@ class JenkinsModuleTest(TestCase):
         }
         
         module.install(request, self.tool)
-        target_func = mock_thread.call_args[1]['target']
+        target_func = mock_submit.call_args[0][1]
         
         # Mock Docker components
         mock_cli = MagicMock()
@@ -183,6 +870,14 @@ class JenkinsModuleTest(TestCase):
         mock_container.logs.return_value = b"Please use the following password to proceed to installation:\n1234567890abcdef1234567890abcdef\n"
         mock_cli.containers.run.return_value = mock_container
         mock_cli.networks.get.return_value = None
+        # Plugin provisioning: none before, the full set after jenkins-plugin-cli ran
+        counts = iter([b"0\n", b"40\n", b"40\n"])
+
+        def exec_run(cmd, **kwargs):
+            if 'wc -l' in cmd:
+                return MagicMock(exit_code=0, output=next(counts))
+            return MagicMock(exit_code=0, output=b"")
+        mock_container.exec_run.side_effect = exec_run
         
         # Mock Jenkins API
         mock_server = MagicMock()
@@ -193,9 +888,54 @@ class JenkinsModuleTest(TestCase):
         
         self.tool.refresh_from_db()
         self.assertEqual(self.tool.status, 'installed')
+        self.assertEqual(self.tool.current_stage, "Jenkins installed, configured and plugins installed")
+        # New plugins were added: Jenkins restarts once to load them
+        mock_container.restart.assert_called_once()
         self.assertEqual(self.tool.config_data['api_token'], 'test-api-token')
         self.assertEqual(self.tool.config_data['port'], '8081')
         self.assertEqual(self.tool.config_data['container_name'], 'jenkins_cont')
+        self.assertNotIn('install', self.tool.config_data)
+
+    @patch('modules.jenkins.module.ReadinessProbe')
+    @patch('modules.jenkins.module.DockerCLI')
+    @patch('jenkins.Jenkins')
+    @patch('modules.jenkins.module.install_scheduler.submit')
+    def test_jenkins_install_resumes_from_checkpoint(self, mock_submit, mock_jenkins, mock_docker, mock_probe):
+        from modules.jenkins.module import Module
+        module = Module()
+        self.tool.status = 'installing'
+        self.tool.config_data['port'] = '8080'
+        self.tool.config_data['install'] = {
+            'params': {
+                'port': '8080', 'jnlp_port': '50000', 'volume_name': 'jenkins_home', 'container_name': 'jenkins',
+                'plugin_cache_volume': 'jenkins_plugin_cache', 'privileged': False,
+            },
+            'completed': ['volume:jenkins_home', 'volume:jenkins_plugin_cache', 'network', 'image', 'container'],
+        }
+        self.tool.save()
+
+        # The process restarted: the next GET picks the install up again
+        request = MagicMock()
+        request.method = 'GET'
+        with patch('modules.jenkins.module.install_scheduler.is_running', return_value=False):
+            module.install(request, self.tool)
+        mock_submit.assert_called_once()
+
+        mock_cli = MagicMock()
+        mock_docker.return_value = mock_cli
+        mock_container = MagicMock()
+        mock_container.status = 'exited'
+        mock_container.logs.return_value = b"Please use the following password to proceed to installation:\n1234567890abcdef1234567890abcdef\n"
+        mock_cli.containers.get.return_value = mock_container
+        mock_jenkins.return_value.run_script.return_value = "SOLSTICE_JENKINS_TOKEN:test-api-token"
+
+        mock_submit.call_args[0][1]()
+
+        mock_cli.volumes.create.assert_not_called()
+        mock_cli.containers.run.assert_not_called()
+        mock_container.start.assert_called_once()
+        self.tool.refresh_from_db()
+        self.assertEqual(self.tool.status, 'installed')
 
     @patch('jenkins.Jenkins')
     def test_jenkins_context_data_tabs(self, mock_jenkins):
@@ -204,7 +944,13 @@ class JenkinsModuleTest(TestCase):
         
         mock_server = MagicMock()
         mock_jenkins.return_value = mock_server
-        mock_server.get_nodes.return_value = [{'name': 'master'}]
+        mock_server.get_info.side_effect = lambda item, query: {
+            'computer': {'computer': [{'displayName': 'master', 'offline': False, 'executors': [{'idle': False}, {'idle': True}]}]},
+            'queue': {'items': []},
+        }[item]
+        mock_server.server = 'http://localhost:8080/'
+        mock_server.jenkins_request.return_value = MagicMock(headers={'X-Jenkins': '2.440'})
+        mock_server.jenkins_request.return_value.json.return_value = {'plugins': [{'shortName': 'git', 'version': '5.0'}]}
         mock_server.get_plugins_info.return_value = [{'name': 'git'}]
         
         self.tool.config_data['api_token'] = 'token'
@@ -215,12 +961,13 @@ class JenkinsModuleTest(TestCase):
         # Test nodes tab
         request.GET = {'tab': 'jenkins_nodes'}
         context = module.get_context_data(request, self.tool)
-        self.assertEqual(context['jenkins_nodes'], [{'name': 'master'}])
+        self.assertEqual([(n['name'], n['busy'], n['executors'], n['instance']) for n in context['jenkins_nodes']], [('master', 1, 2, 'jenkins')])
+        self.assertEqual(context['jenkins_queues'][0]['length'], 0)
         
         # Test plugins tab
         request.GET = {'tab': 'jenkins_plugins'}
         context = module.get_context_data(request, self.tool)
-        self.assertEqual(context['jenkins_plugins'], [{'name': 'git'}])
+        self.assertEqual(context['jenkins_plugins'], [{'name': 'git', 'update': None, 'conflicts': [], 'instance': 'jenkins'}])
 
     @patch('jenkins.Jenkins')
     def test_jenkins_auth_errors(self, mock_jenkins):
@@ -245,3 +992,89 @@ class JenkinsModuleTest(TestCase):
         
         context = module.get_context_data(MagicMock(), self.tool)
         self.assertTrue(context.get('jenkins_auth_required'))
+
+    def test_jenkins_plugin_inventory_fingerprint(self):
+        from modules.jenkins.plugins import load_inventory, plugin_diff
+        server = MagicMock()
+        server.server = 'http://x/'
+        shallow = {'plugins': [{'shortName': 'git', 'version': '5.0'}, {'shortName': 'scm-api', 'version': '600.v1'}]}
+        server.jenkins_request.return_value = MagicMock(headers={'X-Jenkins': '2.440'})
+        server.jenkins_request.return_value.json.side_effect = lambda: shallow
+        server.get_plugins_info.return_value = [
+            {'shortName': 'git', 'version': '5.0', 'dependencies': [
+                {'shortName': 'scm-api', 'version': '700.v2', 'optional': False},
+                {'shortName': 'credentials', 'version': '1.0', 'optional': False},
+                {'shortName': 'ssh', 'version': '1.0', 'optional': True},
+            ]},
+            {'shortName': 'scm-api', 'version': '600.v1', 'dependencies': []},
+        ]
+
+        core, plugins = load_inventory('http://x', server)
+        self.assertEqual(core, '2.440')
+        # Fingerprint still fresh: served from cache
+        load_inventory('http://x', server)
+        self.assertEqual(server.get_plugins_info.call_count, 1)
+        # One shallow request, not the dashboard page get_version() would render
+        self.assertEqual(server.jenkins_request.call_count, 1)
+        self.assertEqual(server.jenkins_request.call_args[0][0].url, 'http://x/pluginManager/api/json')
+        server.get_version.assert_not_called()
+
+        # Same plugin set after the check expires: no deep fetch
+        cache.delete('jenkins:plugins:fingerprint:http://x')
+        load_inventory('http://x', server)
+        self.assertEqual(server.get_plugins_info.call_count, 1)
+        # A plugin changed version: the full inventory is fetched again
+        shallow['plugins'][1]['version'] = '700.v2'
+        cache.delete('jenkins:plugins:fingerprint:http://x')
+        load_inventory('http://x', server)
+        self.assertEqual(server.get_plugins_info.call_count, 2)
+
+        rows = {p['shortName']: p for p in plugin_diff(plugins, {'git': {'version': '5.2', 'requiredCore': '2.452'}}, core)}
+        self.assertEqual(rows['git']['update'], '5.2')
+        self.assertEqual(rows['git']['update_requires_core'], '2.452')
+        self.assertEqual(rows['git']['conflicts'], ['needs scm-api 700.v2, has 600.v1', 'credentials 1.0 is missing'])
+        self.assertIsNone(rows['scm-api']['update'])
+        self.assertNotIn('dependencies', rows['git'])
+
+    @patch('jenkins.Jenkins')
+    def test_jenkins_calls_instrumented_and_exported(self, mock_jenkins):
+        from modules.jenkins.module import Module
+        module = Module()
+        mock_jenkins.return_value.get_info.return_value = {'jobs': []}
+        request = MagicMock()
+        request.GET = {'tab': 'jenkins_jobs'}
+        module.get_context_data(request, self.tool)
+        request.GET = {'tab': 'no-such-tab'}
+        module.get_context_data(request, self.tool)
+        request.GET = {'tab': 'jenkins_plugins'}
+        mock_jenkins.return_value.server = 'http://localhost:8080/'
+        mock_jenkins.return_value.jenkins_request.side_effect = ConnectionError('refused')
+        context = module.get_context_data(request, self.tool)
+        self.assertIn('jenkins_error', context)
+
+        self.assertEqual(registry.latency['get_info:root'].count, 1)
+        self.assertEqual(registry.latency['tab:jenkins_jobs'].count, 2)
+        self.assertNotIn('tab:no-such-tab', registry.latency)
+        self.assertEqual(registry.errors[('jenkins_request', 'ConnectionError')], 1)
+        self.assertEqual(registry.cache[('jobs', 'miss')], 1)
+        self.assertEqual(registry.cache[('jobs', 'hit')], 1)
+
+        with self.assertLogs('modules.jenkins.metrics', 'WARNING'), override_settings(JENKINS_SLOW_CALL_MS=0.001):
+            from modules.jenkins.metrics import timed
+            with timed('docker.containers.get'):
+                pass
+
+        response = self.client.get(reverse('jenkins_metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('jenkins_call_duration_seconds_count{operation="get_info:root"} 1', body)
+        self.assertIn('jenkins_call_errors_total{operation="jenkins_request",error="ConnectionError"} 1', body)
+        self.assertIn('jenkins_cache_requests_total{cache="jobs",result="hit"} 1', body)
+
+        # Scrapers authenticate with the metrics token
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('jenkins_metrics')).status_code, 403)
+        self.tool.config_data['metrics_token'] = 'scrape'
+        self.tool.save()
+        response = self.client.get(reverse('jenkins_metrics'), HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
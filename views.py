@@ -1,7 +1,26 @@
-from django.shortcuts import redirect, get_object_or_404
+import hmac
+import json
+import secrets
+
+from django.shortcuts import redirect, get_object_or_404, render
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.views.decorators.csrf import csrf_exempt
+from requests.auth import HTTPBasicAuth
 from core.models import Tool
 from django.contrib.auth.decorators import login_required
-from core.docker_cli_wrapper import DockerCLI
+from .client import get_tool_client, get_credentials, get_breaker, invalidate_clients, jenkins_url
+from .installer import progress_cache_key
+from .containers import discover_controllers
+from .instances import get_instances
+from .jobs import Job, parse_notification, apply_notification
+from .snapshots import update_snapshot, DEFAULT_TTL
+from .history import job_path
+from .console import stream_console
+from .actions import start_bulk, progress_key, ACTIONS, BULK_CONCURRENCY, BULK_RATE
+from .metrics import timed, registry
+from . import events
 
 @login_required
 def update_creds(request):
@@ -13,6 +32,7 @@ def update_creds(request):
             tool.config_data['username'] = username
             tool.config_data['password'] = password
             tool.save()
+            invalidate_clients(jenkins_url(tool))
     return redirect('tool_detail', tool_name='jenkins')
 
 @login_required
@@ -22,17 +42,14 @@ def change_admin_password(request):
         new_password = request.POST.get('new_password')
         if new_password:
             try:
-                import jenkins as jenkins_api
-                
-                port = tool.config_data.get('port', '8080')
-                jenkins_url = f"http://localhost:{port}"
                 username = tool.config_data.get('username', 'admin')
-                password = tool.config_data.get('api_token') or tool.config_data.get('password')
-                
-                if username and password:
-                    server = jenkins_api.Jenkins(jenkins_url, username=username, password=password)
+                server = get_tool_client(tool) if username else None
+                if server:
                     script = f'hudson.model.User.get("{username}").setCredentials("{new_password}")'
                     server.run_script(script)
+                    # A password-based session is no longer valid after this
+                    if not tool.config_data.get('api_token'):
+                        invalidate_clients(jenkins_url(tool))
             except Exception as e:
                 print(f"Error changing Jenkins password: {e}")
             
@@ -44,37 +61,27 @@ def change_admin_password(request):
 def find_jenkins(request):
     tool = get_object_or_404(Tool, name='jenkins')
     try:
-        client = DockerCLI()
-        # Broaden search: check for any container with 'jenkins' in image or name
-        all_containers = client.containers.list(all=True)
-        found_container = None
-        
-        for c in all_containers:
-            image_tags = c.image.tags
-            if any('jenkins' in tag.lower() for tag in image_tags) or 'jenkins' in c.name.lower():
-                found_container = c
-                break
-        
-        if found_container:
-            tool.status = 'installed' if found_container.status == 'running' else 'error'
-            tool.version = found_container.image.tags[0] if found_container.image.tags else "Unknown"
-            tool.config_data['container_id'] = found_container.id
-            tool.config_data['container_name'] = found_container.name
-            
-            # Try to extract port from host config if available
-            try:
-                ports = found_container.attrs.get('HostConfig', {}).get('PortBindings', {})
-                # Look for the host port mapped to Jenkins' internal 8080 port
-                for container_port, host_bindings in ports.items():
-                    if '8080' in container_port and host_bindings:
-                        detected_port = host_bindings[0].get('HostPort')
-                        if detected_port:
-                            tool.config_data['port'] = detected_port
-                        break
-            except Exception as e:
-                print(f"Error detecting port: {e}")
+        with timed('docker.discover'):
+            controllers = discover_controllers()
+        tool.config_data['controllers'] = controllers
 
+        # Adopt the requested controller, else the one already managed, else the first
+        wanted = request.GET.get('container') or tool.config_data.get('container_name')
+        found = next((c for c in controllers if c['name'] == wanted), controllers[0] if controllers else None)
+
+        if found:
+            tool.status = 'installed' if found['status'] == 'running' else 'error'
+            tool.version = found['version'] or found['image'] or "Unknown"
+            tool.config_data['container_id'] = found['id']
+            tool.config_data['container_name'] = found['name']
+            if found['port']:
+                tool.config_data['port'] = found['port']
+            if found['agent_port']:
+                tool.config_data['jnlp_port'] = found['agent_port']
+            if found['volume']:
+                tool.config_data['volume_name'] = found['volume']
             tool.save()
+            invalidate_clients(jenkins_url(tool))
         else:
             tool.status = 'not_installed'
             tool.config_data['error_log'] = "No Jenkins container found."
@@ -83,3 +90,207 @@ def find_jenkins(request):
         tool.config_data['error_log'] = str(e)
         tool.save()
     return redirect('tool_detail', tool_name='jenkins')
+
+@login_required
+def save_instance(request):
+    if request.method == 'POST':
+        tool = get_object_or_404(Tool, name='jenkins')
+        name = request.POST.get('name')
+        url = request.POST.get('url')
+        if name and url and name != get_instances(tool)[0].name:
+            config = {
+                'name': name,
+                'url': url,
+                'username': request.POST.get('username') or 'admin',
+                'container_name': request.POST.get('container_name') or name,
+            }
+            if request.POST.get('api_token'):
+                config['api_token'] = request.POST['api_token']
+            elif request.POST.get('password'):
+                config['password'] = request.POST['password']
+            # Saving an existing name replaces that controller's settings
+            instances = [c for c in tool.config_data.get('instances', []) if c.get('name') != name]
+            tool.config_data['instances'] = instances + [config]
+            tool.save()
+            invalidate_clients(jenkins_url(get_instances(tool)[-1]))
+    return redirect('tool_detail', tool_name='jenkins')
+
+@login_required
+def remove_instance(request):
+    if request.method == 'POST':
+        tool = get_object_or_404(Tool, name='jenkins')
+        name = request.POST.get('name')
+        for instance in get_instances(tool)[1:]:
+            if instance.name == name:
+                tool.config_data['instances'].remove(instance.config_data)
+                tool.save()
+                invalidate_clients(jenkins_url(instance))
+    return redirect('tool_detail', tool_name='jenkins')
+
+@login_required
+def install_progress(request):
+    tool = get_object_or_404(Tool, name='jenkins')
+    # Live progress is kept in the cache; the database row is only the fallback
+    progress = cache.get(progress_cache_key(tool)) or {'status': tool.status, 'stage': tool.current_stage}
+    response = render(request, 'core/partials/jenkins_install_progress.html', {'tool': tool, 'progress': progress})
+    if progress['status'] != 'installing':
+        # Finished or failed: reload into the installed (or error) page
+        response['HX-Refresh'] = 'true'
+    return response
+
+@csrf_exempt
+def job_webhook(request):
+    """Build notifications from Jenkins (Notification plugin, JSON format).
+
+    Authenticated with the tool's webhook token, sent as ``X-Jenkins-Token``
+    or ``?token=``. ``?instance=`` names the controller, default the tool's own.
+    """
+    if request.method != 'POST':
+        return HttpResponse(status=405)
+    tool = get_object_or_404(Tool, name='jenkins')
+    expected = tool.config_data.get('webhook_token')
+    if not expected:
+        return HttpResponse(status=404)
+    token = request.headers.get('X-Jenkins-Token') or request.GET.get('token') or ''
+    if not hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8')):
+        return HttpResponse(status=403)
+    instances = get_instances(tool)
+    instance = next((i for i in instances if i.name == request.GET.get('instance')), instances[0])
+    try:
+        name, phase, result = parse_notification(json.loads(request.body))
+    except (ValueError, AttributeError):
+        return HttpResponse(status=400)
+
+    url = jenkins_url(instance)
+    changed = {}
+
+    def update(jobs):
+        before = {job.name: job.color for job in jobs}
+        jobs = apply_notification(jobs, name, phase, result, url=f"{url}/{job_path(name)}/")
+        for job in jobs:
+            if job.name == name and before.get(name) != job.color:
+                changed['job'] = Job(job.name, job.url, job.color, instance.name)
+        return jobs
+
+    # Only the cached snapshot is touched: without one the next view fetches anyway
+    update_snapshot(f"jenkins:jobs:{url}", update, ttl=int(instance.config_data.get('jobs_cache_ttl', DEFAULT_TTL)))
+    if changed:
+        events.publish('job', render_to_string('core/partials/jenkins_job_status.html', {'job': changed['job']}))
+    return HttpResponse(status=204)
+
+@login_required
+def job_events(request):
+    tool = get_object_or_404(Tool, name='jenkins')
+    if not tool.config_data.get('webhook_token'):
+        # Nothing is ever published without notifications; 204 stops EventSource reconnecting
+        return HttpResponse(status=204)
+    try:
+        since = int(request.headers.get('Last-Event-ID'))
+    except (TypeError, ValueError):
+        since = None
+    response = StreamingHttpResponse(events.stream(since), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let a proxy buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def rotate_webhook_token(request):
+    if request.method == 'POST':
+        tool = get_object_or_404(Tool, name='jenkins')
+        tool.config_data['webhook_token'] = secrets.token_urlsafe(32)
+        tool.save()
+    return redirect('tool_detail', tool_name='jenkins')
+
+def _console_target(request):
+    tool = get_object_or_404(Tool, name='jenkins')
+    instances = get_instances(tool)
+    instance = next((i for i in instances if i.name == request.GET.get('instance')), instances[0])
+    return instance, get_tool_client(instance), request.GET.get('job', '')
+
+@login_required
+def build_console(request):
+    instance, server, job = _console_target(request)
+    context = {'job': job, 'instance': instance, 'number': request.GET.get('build')}
+    if not server:
+        context['jenkins_auth_required'] = True
+    elif not context['number']:
+        try:
+            # Pin the build now so a reconnect can't resume into a newer one
+            info = server.get_info(job_path(job), '?tree=lastBuild[number]')
+            context['number'] = (info.get('lastBuild') or {}).get('number')
+        except Exception as e:
+            context['jenkins_error'] = str(e).split('\n')[0]
+    return render(request, 'core/partials/jenkins_console.html', context)
+
+@login_required
+def build_console_stream(request):
+    instance, server, job = _console_target(request)
+    try:
+        number = int(request.GET.get('build'))
+        start = int(request.headers.get('Last-Event-ID') or request.GET.get('start') or 0)
+    except (TypeError, ValueError):
+        return HttpResponse(status=400)
+    if not server:
+        return HttpResponse(status=403)
+    breaker = get_breaker(jenkins_url(instance))
+    if not breaker.allow():
+        # Known to be down: one failed event instead of a request that times out
+        data = json.dumps({'error': breaker.reason or "Jenkins is not responding."})
+        return HttpResponse(f"event: failed\ndata: {data}\n\n", content_type='text/event-stream')
+    # The pooled client only sets its auth on its own first request
+    username, password = get_credentials(instance)
+    stream = stream_console(server, job, number, start, auth=HTTPBasicAuth(username, password), breaker=breaker)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def bulk_action(request):
+    if request.method != 'POST':
+        return HttpResponse(status=405)
+    tool = get_object_or_404(Tool, name='jenkins')
+    action = request.POST.get('action')
+    if action not in ACTIONS:
+        return HttpResponse(status=400)
+    instances = {instance.name: instance for instance in get_instances(tool)}
+    clients = {}
+    targets = []
+    for value in request.POST.getlist('jobs'):
+        # "<job>|<instance>": '|' can't appear in a Jenkins job name
+        job, _, name = value.partition('|')
+        instance = instances.get(name)
+        if not job or not instance:
+            continue
+        if name not in clients:
+            clients[name] = get_tool_client(instance)
+        if clients[name]:
+            targets.append((instance, clients[name], job))
+    run_id = start_bulk(
+        action, targets,
+        concurrency=int(tool.config_data.get('bulk_concurrency', BULK_CONCURRENCY)),
+        rate=float(tool.config_data.get('bulk_rate', BULK_RATE)),
+    )
+    return render(request, 'core/partials/jenkins_bulk_progress.html', {'run_id': run_id, 'progress': cache.get(progress_key(run_id))})
+
+@login_required
+def bulk_progress(request, run_id):
+    progress = cache.get(progress_key(run_id))
+    if progress is None:
+        return HttpResponse(status=404)
+    return render(request, 'core/partials/jenkins_bulk_progress.html', {'run_id': run_id, 'progress': progress})
+
+def metrics(request):
+    """Call metrics in the Prometheus text format.
+
+    Open to logged-in users, and to scrapers sending the tool's
+    ``metrics_token`` as ``Authorization: Bearer <token>``.
+    """
+    if not request.user.is_authenticated:
+        tool = Tool.objects.filter(name='jenkins').first()
+        expected = tool.config_data.get('metrics_token') if tool else None
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if not expected or scheme != 'Bearer' or not hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8')):
+            return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')